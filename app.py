@@ -1,14 +1,19 @@
-from flask import Flask, render_template, jsonify
-import sqlite3
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 import json
 import os
 
+from storage import create_backend
+
 app = Flask(__name__)
 
-def get_db_connection():
-    conn = sqlite3.connect('bot_database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# Та же база, что у бота (настройка "database" в config.json)
+config = {}
+if os.path.exists('config.json'):
+    with open('config.json') as f:
+        config = json.load(f)
+
+# Сайт только читает базу через пул соединений; чтение не мешает записи бота
+backend = create_backend(config.get('database'))
 
 @app.route('/')
 def index():
@@ -18,17 +23,18 @@ def index():
 @app.route('/teams')
 def teams():
     """API для получения всех команд."""
-    conn = get_db_connection()
-    teams = conn.execute('SELECT * FROM teams').fetchall()
-    conn.close()
+    with backend.connection() as conn:
+        teams = conn.execute('SELECT * FROM teams ORDER BY id').fetchall()
+        members = {}
+        for member in conn.execute('SELECT team_id, user_id FROM team_members ORDER BY team_id, joined_at, user_id'):
+            members.setdefault(member['team_id'], []).append(member['user_id'])
     
     teams_list = []
     for team in teams:
-        members = json.loads(team['members'])
         teams_list.append({
             'id': team['id'],
             'name': team['name'],
-            'members': members,
+            'members': members.get(team['id'], []),
             'created_by': team['created_by'],
             'created_at': team['created_at']
         })
@@ -37,10 +43,55 @@ def teams():
 
 @app.route('/reminders')
 def reminders():
-    """API для получения всех напоминаний."""
-    conn = get_db_connection()
-    reminders = conn.execute('SELECT * FROM reminders').fetchall()
-    conn.close()
+    """API для получения всех напоминаний (с архивом при ?archived=1).
+    
+    Напоминаний может быть много: строки читаются из базы порциями и сразу
+    отправляются клиенту элементами JSON-массива, весь список в памяти не собирается.
+    """
+    queries = ['SELECT * FROM reminders']
+    if request.args.get('archived') == '1':
+        queries.append(
+            'SELECT id, user_id, reminder_time, archived_text(reminder_text) AS reminder_text, '
+            'team_id, team_name, recurrence, status, created_at FROM reminders_archive'
+        )
+    
+    def generate():
+        yield '['
+        separator = ''
+        with backend.connection() as conn:
+            for query in queries:
+                for reminder in backend.stream(conn, query):
+                    yield separator + app.json.dumps({
+                        'id': reminder['id'],
+                        'user_id': reminder['user_id'],
+                        'reminder_time': reminder['reminder_time'],
+                        'reminder_text': reminder['reminder_text'],
+                        'team_id': reminder['team_id'],
+                        'team_name': reminder['team_name'],
+                        'recurrence': reminder['recurrence'],
+                        'status': reminder['status'],
+                        'created_at': reminder['created_at']
+                    })
+                    separator = ','
+        yield ']'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/reminders/search')
+def search_reminders():
+    """API для полнотекстового поиска напоминаний (?q=запрос&limit=50), самые релевантные первыми."""
+    sql = backend.dialect
+    query = sql.search_query(request.args.get('q', ''))
+    if not query:
+        return jsonify([])
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    
+    with backend.connection() as conn:
+        reminders = conn.execute(
+            f'SELECT reminders.* FROM {sql.search_source} WHERE {sql.search_match} '
+            f'ORDER BY {sql.search_rank} LIMIT ?',
+            (query, limit)
+        ).fetchall()
     
     reminders_list = []
     for reminder in reminders:
@@ -49,7 +100,10 @@ def reminders():
             'user_id': reminder['user_id'],
             'reminder_time': reminder['reminder_time'],
             'reminder_text': reminder['reminder_text'],
+            'team_id': reminder['team_id'],
             'team_name': reminder['team_name'],
+            'recurrence': reminder['recurrence'],
+            'status': reminder['status'],
             'created_at': reminder['created_at']
         })
     
@@ -0,0 +1,105 @@
+"""
+Архивирование обработанных напоминаний.
+
+Фоновая задача небольшими пачками переносит из таблицы reminders в
+reminders_archive отправленные и неотправленные (failed) разовые напоминания,
+а также разовые напоминания, просроченные слишком давно. В reminders остаётся
+только будущая работа, а история доступна по запросу.
+
+Текст архивных напоминаний можно хранить сжатым (zlib); функция SQLite
+archived_text() возвращает текст независимо от того, сжат он или нет.
+"""
+
+import asyncio
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+def archive_text(text):
+    """Сжатие текста напоминания для архива."""
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'))
+
+
+def archived_text(value):
+    """Текст архивного напоминания (сжатый или нет)."""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def register_functions(conn):
+    """Регистрация функций архива в соединении SQLite."""
+    conn.create_function("archive_text", 1, archive_text, deterministic=True)
+    conn.create_function("archived_text", 1, archived_text, deterministic=True)
+
+
+class ReminderArchiver:
+    def __init__(self, db, batch=500, interval=3600, archive_after=86400,
+                 expire_after=7 * 86400, compress=False):
+        """Инициализация архивирования.
+
+        Args:
+            db (AsyncDatabase): База данных с напоминаниями
+            batch (int): Сколько напоминаний переносить за одну транзакцию
+            interval (int): Как часто запускать архивирование (в секундах)
+            archive_after (int): Через сколько секунд после отправки (или неудачи) архивировать обработанные напоминания
+            expire_after (int): Через сколько секунд считать неотправленное разовое напоминание устаревшим
+            compress (bool): Сжимать ли текст архивных напоминаний
+        """
+        self.db = db
+        self.batch = batch
+        self.interval = interval
+        self.archive_after = archive_after
+        self.expire_after = expire_after
+        self.compress = compress
+        self._task = None
+
+    def start(self):
+        """Запуск периодического архивирования."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка архивирования."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def compact(self):
+        """Перенос в архив всех подходящих напоминаний, пачка за пачкой.
+
+        Returns:
+            int: Количество перенесённых напоминаний
+        """
+        total = 0
+        while True:
+            now = time.time()
+            moved = await self.db.archive_reminders(
+                now - self.archive_after, now - self.expire_after, self.batch, self.compress
+            )
+            total += moved
+            if moved < self.batch:
+                break
+            # Между пачками отдаём управление, чтобы не задерживать бота
+            await asyncio.sleep(0.1)
+        if total:
+            logger.info(f"В архив перенесено напоминаний: {total}")
+        return total
+
+    async def _run(self):
+        while True:
+            # Первый запуск тоже после паузы: после простоя сначала досылаются просроченные напоминания
+            await asyncio.sleep(self.interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Ошибка архивирования напоминаний: {e}")
@@ -0,0 +1,111 @@
+"""
+Асинхронный доступ к базе данных.
+
+Все методы Database выполняются в одном выделенном потоке, а обработчики бота,
+планировщик и отправитель ждут результат через await. Медленный диск не
+останавливает цикл событий, а запросы к общему соединению и курсору никогда
+не выполняются одновременно.
+
+При включённом group commit операции записи от разных обработчиков копятся
+несколько миллисекунд (или до заданного количества) и выполняются одной
+транзакцией через Database.run_batch; каждый вызывающий получает свой результат.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+BATCH_SIZE = metrics.histogram(
+    'db_group_commit_operations', 'Количество операций записи в одной транзакции', metrics.COUNT_BUCKETS
+)
+
+
+class AsyncDatabase:
+    def __init__(self, db, group_commit=(), batch_size=100, batch_delay=0.005):
+        """Инициализация асинхронной обёртки.
+
+        Args:
+            db (Database): База данных; дальше используется только из потока базы
+            group_commit (iterable): Методы записи, которые объединяются в общие транзакции
+                (пусто - group commit выключен)
+            batch_size (int): Максимум операций в одной транзакции
+            batch_delay (float): Сколько секунд копить операции перед записью
+        """
+        self._db = db
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self.group_commit = set(group_commit)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._pending = []  # (имя метода, args, kwargs, future)
+        self._flush_handle = None
+
+    def run(self, function, *args, **kwargs):
+        """Выполнение функции в потоке базы данных.
+
+        Returns:
+            Future: Результат функции, который можно ждать через await
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attribute = getattr(self._db, name)
+        if not callable(attribute):
+            return attribute
+
+        if name in self.group_commit:
+            @functools.wraps(attribute)
+            async def call(*args, **kwargs):
+                return await self._write(name, args, kwargs)
+        else:
+            @functools.wraps(attribute)
+            async def call(*args, **kwargs):
+                return await self.run(attribute, *args, **kwargs)
+
+        # Запоминаем обёртку, чтобы не создавать её при каждом вызове
+        setattr(self, name, call)
+        return call
+
+    def _write(self, name, args, kwargs):
+        """Постановка операции записи в следующую общую транзакцию."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((name, args, kwargs, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return future
+
+    def _flush(self):
+        """Отправка накопленных операций записи в поток базы одной транзакцией."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        BATCH_SIZE.observe(len(batch))
+        done = self.run(self._db.run_batch, [(name, args, kwargs) for name, args, kwargs, _ in batch])
+        done.add_done_callback(functools.partial(self._resolve, batch))
+
+    @staticmethod
+    def _resolve(batch, done):
+        """Передача результатов транзакции вызывающим."""
+        futures = [future for _, _, _, future in batch]
+        if done.exception() is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(done.exception())
+            return
+        for future, result in zip(futures, done.result()):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Закрытие соединения и остановка потока базы данных."""
+        self._flush()
+        await self.run(self._db.close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,249 @@
+"""
+Резервное копирование базы SQLite без остановки бота.
+
+Снимок снимается через online backup API SQLite: за один шаг копируется
+несколько страниц, между шагами поток копирования спит. Всё копирование
+идёт в одной читающей транзакции: в режиме WAL она не мешает записи, поэтому
+планировщик и обработчики бота продолжают работать, а шаги видят один и тот
+же снимок базы и не начинают копирование заново после каждой записи.
+
+Снимок сначала пишется во временный файл, проверяется (quick_check) и
+только потом получает своё имя, поэтому в каталоге снимков всегда лежат
+целые базы. Бот снимает их раз в "backup_interval" секунд в каталог
+"backup_dir" (config.json) и хранит "backup_keep" последних.
+
+Восстановление записывает снимок в базу целиком под блокировкой записи;
+бота, планировщики и отправители на это время лучше остановить.
+
+Для PostgreSQL используйте pg_dump.
+
+Запуск:
+    python backup.py create [-o backups]
+    python backup.py list [-o backups]
+    python backup.py restore backups/bot_database-20240101-120000.db
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from storage import DB_NAME, connect
+
+logger = logging.getLogger(__name__)
+
+# Сколько страниц копировать за один шаг (при странице 4 КиБ - 4 МиБ)
+BACKUP_PAGES = 1024
+# Пауза между шагами в секундах
+BACKUP_PAUSE = 0.01
+
+SNAPSHOT_PREFIX = "bot_database-"
+SNAPSHOT_SUFFIX = ".db"
+SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+# Незаконченный снимок (остаётся после сбоя и удаляется при очистке)
+PARTIAL_SUFFIX = ".part"
+
+
+def backup(db_name, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """Копирование базы в файл по нескольку страниц за шаг.
+
+    Args:
+        db_name (str): Путь к файлу базы
+        target (str): Путь к файлу копии (перезаписывается)
+        pages (int): Сколько страниц копировать за один шаг
+        pause (float): Пауза между шагами в секундах
+
+    Returns:
+        int: Количество скопированных страниц
+    """
+    source = connect(db_name, readonly=True)
+    destination = sqlite3.connect(target)
+    total = 0
+
+    def progress(status, remaining, pagecount):
+        nonlocal total
+        total = pagecount
+        # Пауза в потоке копирования, а не в потоке базы бота
+        time.sleep(pause)
+
+    try:
+        # Читающая транзакция на всё время копирования: шаги видят один снимок базы
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(destination, pages=pages, progress=progress)
+        # Снимок - один самодостаточный файл без журнала WAL
+        destination.execute("PRAGMA journal_mode = DELETE")
+        return total
+    finally:
+        destination.close()
+        source.close()
+
+
+def check(path):
+    """Проверка целостности файла базы.
+
+    Returns:
+        bool: True, если база цела
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+    finally:
+        conn.close()
+
+
+def list_snapshots(directory):
+    """Снимки в каталоге, от старых к новым.
+
+    Returns:
+        list: Пути к файлам снимков
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+def prune_snapshots(directory, keep):
+    """Удаление старых снимков и незаконченных после сбоя копий.
+
+    Args:
+        directory (str): Каталог снимков
+        keep (int): Сколько последних снимков хранить
+
+    Returns:
+        int: Количество удалённых файлов
+    """
+    stale = list_snapshots(directory)[:-keep] if keep > 0 else []
+    stale += [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(PARTIAL_SUFFIX)
+    ]
+    for path in stale:
+        os.remove(path)
+        logger.info(f"Удалён старый снимок базы {path}")
+    return len(stale)
+
+
+def create_snapshot(db_name, directory, keep=7):
+    """Снимок базы в каталоге снимков.
+
+    Args:
+        db_name (str): Путь к файлу базы
+        directory (str): Каталог снимков
+        keep (int): Сколько последних снимков хранить (0 - все)
+
+    Returns:
+        str: Путь к снимку
+    """
+    os.makedirs(directory, exist_ok=True)
+    started = time.monotonic()
+    path = os.path.join(directory, SNAPSHOT_PREFIX + datetime.now().strftime(SNAPSHOT_TIME_FORMAT) + SNAPSHOT_SUFFIX)
+    partial = path + PARTIAL_SUFFIX
+    try:
+        pages = backup(db_name, partial)
+        if not check(partial):
+            raise sqlite3.DatabaseError(f"Снимок {partial} не прошёл проверку целостности")
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    logger.info(f"Снимок базы сохранён в {path}: {pages} страниц за {time.monotonic() - started:.1f} с")
+    prune_snapshots(directory, keep)
+    return path
+
+
+def restore(snapshot, db_name):
+    """Восстановление базы из снимка.
+
+    База перезаписывается целиком одной транзакцией: другие процессы на это
+    время ждут освобождения базы или получают "database is locked".
+
+    Args:
+        snapshot (str): Путь к снимку
+        db_name (str): Путь к файлу базы
+    """
+    if not check(snapshot):
+        raise sqlite3.DatabaseError(f"Снимок {snapshot} повреждён")
+    source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    destination = connect(db_name)
+    try:
+        source.backup(destination)
+        # Снимок хранится без журнала; база бота работает в режиме WAL
+        destination.execute("PRAGMA journal_mode = WAL")
+    finally:
+        destination.close()
+        source.close()
+    logger.info(f"База {db_name} восстановлена из снимка {snapshot}")
+
+
+async def backup_loop(db_name, directory, interval=86400, keep=7):
+    """Периодические снимки базы.
+
+    Копирование идёт в отдельном потоке (не в потоке базы бота), поэтому
+    запросы бота не ждут его окончания.
+
+    Args:
+        db_name (str): Путь к файлу базы
+        directory (str): Каталог снимков
+        interval (int): Как часто снимать базу (в секундах)
+        keep (int): Сколько последних снимков хранить
+    """
+    while True:
+        # После перезапуска отсчитываем интервал от последнего снимка
+        snapshots = list_snapshots(directory)
+        age = time.time() - os.path.getmtime(snapshots[-1]) if snapshots else interval
+        await asyncio.sleep(max(interval - age, 0))
+        try:
+            await asyncio.to_thread(create_snapshot, db_name, directory, keep)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Ошибка резервного копирования базы: {e}")
+            await asyncio.sleep(interval)
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    config = {}
+    if os.path.exists('config.json'):
+        with open('config.json') as f:
+            config = json.load(f)
+    settings = config.get("database") or {}
+    if settings.get("backend", "sqlite") != "sqlite":
+        logger.error("Резервное копирование работает только с SQLite, для PostgreSQL используйте pg_dump")
+        return 1
+    db_name = settings.get("path", DB_NAME)
+
+    parser = argparse.ArgumentParser(description="Резервное копирование базы SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("create", "Снять снимок базы"), ("list", "Показать снимки")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("-o", "--directory", default=config.get("backup_dir", "backups"), help="Каталог снимков")
+    restore_parser = commands.add_parser("restore", help="Восстановить базу из снимка")
+    restore_parser.add_argument("snapshot", help="Файл снимка")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            create_snapshot(db_name, args.directory, config.get("backup_keep", 7))
+        elif args.command == "list":
+            for path in list_snapshots(args.directory):
+                print(f"{path}\t{os.path.getsize(path)}")
+        else:
+            restore(args.snapshot, db_name)
+        return 0
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Ошибка резервного копирования: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,11 @@ Telegram бот для управления напоминаниями и ком
 Версия для python-telegram-bot 20.4 и Python 3.13
 """
 
+import asyncio
 import json
 import logging
-import sqlite3
 import os
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import calendar
 from typing import Dict, List, Any, Optional, Union
 
@@ -19,10 +19,22 @@ from telegram.ext import (
     CommandHandler,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 
+import metrics
+from archive import ReminderArchiver
+from async_db import AsyncDatabase
+from backup import backup_loop
+from cache import LRUCache
+from delivery import SendEngine
+from outbox import OutboxSender
+from recurrence import describe_rule, next_occurrence, validate_rule
+from scheduler import ReminderScheduler
+from storage import DATABASE_ERRORS, SQLiteBackend, checkpoint_loop, create_backend
+
 # Настройка логирования
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -38,44 +50,240 @@ TOKEN=config["TOKEN"]
 MENU, TEAM, TEAM_NAME, TEAM_MEMBERS, TEAM_VIEW = range(5)
 REMINDER, REMINDER_CREATE, REMINDER_TEAM, REMINDER_TEXT, REMINDER_DATE, REMINDER_TIME, REMINDER_VIEW = range(5, 12)
 INVITES, INVITE_ACTIONS, TEAM_LEAVE = range(12, 15)  # Новые состояния для управления приглашениями и выходом из команды
+REMINDER_REPEAT = 15  # Выбор повторения напоминания
+REMINDER_SEARCH = 16  # Ввод запроса для поиска напоминаний
 
 # Хранилище данных пользователя
 user_data_dict: Dict[int, Dict[str, Any]] = {}
 
+# Сколько элементов показывать на одной странице списка и сколько символов текста напоминания
+# (сообщение Telegram - не больше 4096 символов)
+PAGE_SIZE = 10
+PREVIEW_LENGTH = 300
+
+# Шаблоны текста напоминаний (подставляются прямо в SQL через printf)
+PERSONAL_REMINDER_TEMPLATE = "⏰ Напоминание:\n\n%s"
+TEAM_REMINDER_TEMPLATE = "⏰ Напоминание для команды %s:\n\n%s"
+
+# Количество разделов, по которым напоминания распределяются между процессами планировщика
+SCHEDULER_PARTITIONS = 64
+
+def reminder_shard(user_id):
+    """Раздел планировщика, к которому относится напоминание пользователя."""
+    return user_id % SCHEDULER_PARTITIONS
+
+def reminder_epoch(reminder_time):
+    """Перевод времени напоминания (ISO, локальное время) в UTC epoch в секундах."""
+    if isinstance(reminder_time, str):
+        reminder_time = datetime.fromisoformat(reminder_time)
+    return int(reminder_time.timestamp())
+
+# Методы записи, которые можно объединять в общую транзакцию, и их результат при ошибке
+GROUP_COMMIT_METHODS = {
+    'add_reminder': False,
+    'add_team_invite': None,
+    'add_team_invites': [],
+    'update_invite_status': False,
+    'delete_reminder': False,
+    'delete_reminders': 0
+}
+
+# Схема для PostgreSQL: те же таблицы, что создаёт Database.create_tables для SQLite.
+# Тексты в архиве не сжимаются, archive_text/archived_text оставлены для общих запросов
+POSTGRES_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS teams (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        name TEXT NOT NULL,
+        created_by BIGINT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_teams_name ON teams (name)",
+    '''
+    CREATE TABLE IF NOT EXISTS team_members (
+        team_id BIGINT NOT NULL REFERENCES teams (id),
+        user_id BIGINT NOT NULL,
+        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (team_id, user_id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_team_members_user_id ON team_members (user_id, team_id)",
+    '''
+    CREATE TABLE IF NOT EXISTS reminders (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        reminder_time TEXT NOT NULL,
+        reminder_text TEXT NOT NULL,
+        team_name TEXT,
+        team_id BIGINT REFERENCES teams (id) ON DELETE CASCADE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fire_at BIGINT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        sent_at BIGINT,
+        failed_at BIGINT,
+        shard INTEGER,
+        recurrence TEXT
+    )
+    ''',
+    # Ожидающие напоминания планировщик ищет по времени внутри своих разделов
+    "CREATE INDEX IF NOT EXISTS idx_reminders_pending_fire_at ON reminders (fire_at, shard) WHERE status = 'pending'",
+    "CREATE INDEX IF NOT EXISTS idx_reminders_status_fire_at ON reminders (status, fire_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reminders_user_id ON reminders (user_id)",
+    # Полнотекстовый поиск по тексту напоминаний (см. PostgresDialect.search_match)
+    "CREATE INDEX IF NOT EXISTS idx_reminders_text_search ON reminders USING GIN (to_tsvector('simple', reminder_text))",
+    '''
+    CREATE TABLE IF NOT EXISTS reminders_archive (
+        id BIGINT PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        reminder_time TEXT NOT NULL,
+        reminder_text TEXT,
+        team_name TEXT,
+        team_id BIGINT,
+        recurrence TEXT,
+        status TEXT NOT NULL,
+        fire_at BIGINT,
+        sent_at BIGINT,
+        failed_at BIGINT,
+        created_at TIMESTAMP,
+        archived_at BIGINT NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_reminders_archive_user_id ON reminders_archive (user_id)",
+    "CREATE OR REPLACE FUNCTION archive_text(value TEXT) RETURNS TEXT LANGUAGE sql IMMUTABLE AS 'SELECT value'",
+    "CREATE OR REPLACE FUNCTION archived_text(value TEXT) RETURNS TEXT LANGUAGE sql IMMUTABLE AS 'SELECT value'",
+    '''
+    CREATE TABLE IF NOT EXISTS scheduler_workers (
+        worker_id TEXT PRIMARY KEY,
+        heartbeat_at BIGINT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS scheduler_leases (
+        shard INTEGER PRIMARY KEY,
+        owner TEXT,
+        expires_at BIGINT NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        reminder_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        text TEXT NOT NULL,
+        fire_at BIGINT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at DOUBLE PRECISION NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_outbox_reminder_id ON outbox (reminder_id)",
+    # Приглашения остаются после удаления команды (со статусом canceled), поэтому без внешнего ключа
+    '''
+    CREATE TABLE IF NOT EXISTS team_invites (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        team_id BIGINT NOT NULL,
+        team_name TEXT NOT NULL,
+        invited_username TEXT NOT NULL,
+        invited_by BIGINT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_team_invites_username_status ON team_invites (invited_username, status)",
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        chat_id BIGINT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)"
+]
+
 # Класс для работы с базой данных
 class Database:
-    def __init__(self, db_name="bot_database.db"):
-        """Инициализация базы данных."""
+    def __init__(self, db_name="bot_database.db", cache_size=1024, cache_ttl=300, backend=None):
+        """Инициализация базы данных.
+        
+        Args:
+            db_name (str): Путь к файлу базы SQLite (если backend не указан)
+            cache_size (int): Сколько команд (и списков команд пользователей) держать в кэше
+            cache_ttl (float): Время жизни записей кэша в секундах
+            backend (optional): Бэкенд базы данных из storage.create_backend
+        """
         self.db_name = db_name
+        self.backend = backend or SQLiteBackend(db_name)
+        self.sql = self.backend.dialect  # Различия в SQL между СУБД
         self.conn = None
         self.cursor = None
+        self.scheduler = None  # Планировщик, которому сообщается об изменениях напоминаний
+        self._in_batch = False  # Идёт пакетная запись (run_batch)
+        self._deferred = []  # Действия, отложенные до фиксации пакетной записи
+        self.legacy_team_members = False  # В базе осталась колонка teams.members первой версии
+        # Кэш команд (ID команды -> команда) и ID команд пользователей (ID пользователя -> список)
+        self._teams = LRUCache(cache_size, cache_ttl)
+        self._user_teams = LRUCache(cache_size, cache_ttl)
+        # Количество ожидающих приглашений по username (кнопка "Приглашения" в меню)
+        self._pending_invites = LRUCache(cache_size, cache_ttl)
         self.connect()
         self.create_tables()
     
     def connect(self):
         """Подключение к базе данных."""
         try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.conn.row_factory = sqlite3.Row  # Возвращать результаты как словари
+            # Соединение создаётся в основном потоке, а используется потоком AsyncDatabase
+            self.conn = self.backend.connect(check_same_thread=False)
             self.cursor = self.conn.cursor()
-            logger.info(f"Успешное подключение к базе данных {self.db_name}")
-        except sqlite3.Error as e:
+            logger.info(f"Успешное подключение к базе данных ({self.backend.name})")
+        except DATABASE_ERRORS as e:
             logger.error(f"Ошибка подключения к базе данных: {e}")
     
     def create_tables(self):
         """Создание таблиц в базе данных."""
         try:
+            if self.sql.name == 'postgres':
+                # Схема PostgreSQL сразу актуальная, миграции старых баз SQLite ей не нужны
+                for statement in POSTGRES_SCHEMA:
+                    self.cursor.execute(statement)
+                self._migrate_team_id()
+                self.cursor.executemany(
+                    "INSERT INTO scheduler_leases (shard) VALUES (?) ON CONFLICT DO NOTHING",
+                    [(shard,) for shard in range(SCHEDULER_PARTITIONS)]
+                )
+                self._commit()
+                logger.info("Таблицы успешно созданы или уже существуют")
+                return
+            
             # Таблица команд
             self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS teams (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
-                members TEXT NOT NULL,
                 created_by INTEGER NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             ''')
             
+            # Участники команд
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS team_members (
+                team_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (team_id, user_id),
+                FOREIGN KEY (team_id) REFERENCES teams (id)
+            ) WITHOUT ROWID
+            ''')
+            # Поиск команд пользователя
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_team_members_user_id ON team_members (user_id, team_id)"
+            )
+            self._migrate_team_members()
+            
             # Таблица напоминаний
             self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS reminders (
@@ -84,11 +292,99 @@ class Database:
                 reminder_time TEXT NOT NULL,
                 reminder_text TEXT NOT NULL,
                 team_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                team_id INTEGER REFERENCES teams (id) ON DELETE CASCADE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                fire_at INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                sent_at INTEGER,
+                failed_at INTEGER,
+                shard INTEGER,
+                recurrence TEXT
             )
             ''')
+            self._migrate_fire_at()
+            self._migrate_delivery_status()
+            self._migrate_shard()
+            if not self._has_column('reminders', 'recurrence'):
+                self.cursor.execute("ALTER TABLE reminders ADD COLUMN recurrence TEXT")
+            # Поиск ожидающих отправки напоминаний по времени идёт по этому индексу
+            self.cursor.execute("DROP INDEX IF EXISTS idx_reminders_fire_at")
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_reminders_status_fire_at ON reminders (status, fire_at)"
+            )
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_reminders_user_id ON reminders (user_id)")
+            self._create_search_index()
             
-            # Таблица приглашений в команды
+            # Архив обработанных напоминаний; текст может быть сжат (см. archive.py)
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reminders_archive (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                reminder_time TEXT NOT NULL,
+                reminder_text,
+                team_name TEXT,
+                team_id INTEGER,
+                recurrence TEXT,
+                status TEXT NOT NULL,
+                fire_at INTEGER,
+                sent_at INTEGER,
+                failed_at INTEGER,
+                created_at TIMESTAMP,
+                archived_at INTEGER NOT NULL
+            )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_reminders_archive_user_id ON reminders_archive (user_id)"
+            )
+            # Процессы планировщика и их аренда разделов напоминаний
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scheduler_workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat_at INTEGER NOT NULL
+            )
+            ''')
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scheduler_leases (
+                shard INTEGER PRIMARY KEY,
+                owner TEXT,
+                expires_at INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            self.cursor.executemany(
+                "INSERT INTO scheduler_leases (shard) VALUES (?) ON CONFLICT DO NOTHING",
+                [(shard,) for shard in range(SCHEDULER_PARTITIONS)]
+            )
+            
+            # Очередь готовых к отправке сообщений (outbox), в том числе повторных попыток
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reminder_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                fire_at INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt_at)"
+            )
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_reminder_id ON outbox (reminder_id)"
+            )
+            if not self._has_column('outbox', 'fire_at'):
+                self.cursor.execute("ALTER TABLE outbox ADD COLUMN fire_at INTEGER")
+            self._migrate_delivery_retries()
+            
+            # Таблица приглашений в команды. Приглашения остаются после удаления команды
+            # (со статусом canceled), поэтому без внешнего ключа
+            self.cursor.execute("PRAGMA foreign_key_list(team_invites)")
+            legacy_invites = bool(self.cursor.fetchall())
+            if legacy_invites:
+                self.cursor.execute("ALTER TABLE team_invites RENAME TO team_invites_legacy")
             self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS team_invites (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -97,107 +393,469 @@ class Database:
                 invited_username TEXT NOT NULL,
                 invited_by INTEGER NOT NULL,
                 status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (team_id) REFERENCES teams (id)
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             ''')
+            if legacy_invites:
+                self._migrate_team_invites()
+            # Приглашения ищутся по username и статусу при каждом открытии меню
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_team_invites_username_status "
+                "ON team_invites (invited_username, status)"
+            )
             
-            self.conn.commit()
+            # Известные боту пользователи: по username находим чат для отправки приглашения
+            self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT COLLATE NOCASE,
+                chat_id INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+            
+            # Напоминания команд ищутся по team_id (и удаляются вместе с командой).
+            # Миграция идёт последней: она удаляет сообщения outbox напоминаний удалённых команд
+            self._migrate_team_id()
+            
+            self._commit()
             logger.info("Таблицы успешно созданы или уже существуют")
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка создания таблиц: {e}")
     
+    def _has_column(self, table, column):
+        """Проверка наличия колонки в таблице."""
+        if self.sql.name == 'postgres':
+            self.cursor.execute(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = ? AND column_name = ?",
+                (table, column)
+            )
+            return self.cursor.fetchone() is not None
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        return any(row['name'] == column for row in self.cursor.fetchall())
+    
+    def _migrate_team_members(self):
+        """Перенос участников из колонки teams.members в таблицу team_members.
+        
+        Колонка остаётся в таблице, но больше не читается. После переноса в ней
+        пустой список, поэтому при следующем запуске участники, вышедшие из
+        команды, не возвращаются. Старый модуль database.py хранил участников
+        через запятую, бот - JSON-массивом.
+        """
+        self.legacy_team_members = self._has_column('teams', 'members')
+        if not self.legacy_team_members:
+            return
+        self.cursor.execute('''
+        INSERT OR IGNORE INTO team_members (team_id, user_id)
+        SELECT teams.id, member.value FROM teams, json_each(
+            CASE WHEN json_valid(teams.members) THEN teams.members ELSE '[' || teams.members || ']' END
+        ) AS member
+        WHERE teams.members != '[]'
+        ''')
+        if self.cursor.rowcount:
+            logger.info(f"Перенесено участников команд: {self.cursor.rowcount}")
+        self.cursor.execute("UPDATE teams SET members = '[]' WHERE members != '[]'")
+    
+    def _migrate_fire_at(self):
+        """Добавление колонки fire_at в старые базы и заполнение её по reminder_time."""
+        if not self._has_column('reminders', 'fire_at'):
+            self.cursor.execute("ALTER TABLE reminders ADD COLUMN fire_at INTEGER")
+        
+        self.cursor.execute("SELECT id, reminder_time FROM reminders WHERE fire_at IS NULL")
+        rows = self.cursor.fetchall()
+        updates = []
+        for row in rows:
+            try:
+                updates.append((reminder_epoch(row['reminder_time']), row['id']))
+            except ValueError:
+                logger.error(f"Некорректное время у напоминания {row['id']}: {row['reminder_time']}")
+        if updates:
+            self.cursor.executemany("UPDATE reminders SET fire_at = ? WHERE id = ?", updates)
+            logger.info(f"Заполнено время срабатывания для {len(updates)} напоминаний")
+    
+    def _migrate_delivery_status(self):
+        """Добавление колонок статуса доставки в старые базы.
+        
+        Напоминания, время которых уже прошло, считаются отправленными старой
+        версией бота, чтобы при первом запуске не разослать всю историю заново.
+        """
+        if self._has_column('reminders', 'status'):
+            return
+        self.cursor.execute("ALTER TABLE reminders ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'")
+        self.cursor.execute("ALTER TABLE reminders ADD COLUMN sent_at INTEGER")
+        self.cursor.execute("ALTER TABLE reminders ADD COLUMN failed_at INTEGER")
+        self.cursor.execute(
+            "UPDATE reminders SET status = 'sent', sent_at = fire_at WHERE fire_at < ?",
+            (int(datetime.now().timestamp()),)
+        )
+        logger.info(f"Прошедшие напоминания ({self.cursor.rowcount}) отмечены как отправленные")
+    
+    def _migrate_delivery_retries(self):
+        """Перенос очереди повтора из старой таблицы delivery_retries в outbox."""
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'delivery_retries'")
+        if not self.cursor.fetchone():
+            return
+        self.cursor.execute('''
+        INSERT INTO outbox (reminder_id, chat_id, text, attempts, next_attempt_at, last_error)
+        SELECT reminder_id, chat_id, text, attempts, next_attempt_at, last_error FROM delivery_retries
+        ''')
+        logger.info(f"Перенесено в outbox сообщений из очереди повтора: {self.cursor.rowcount}")
+        self.cursor.execute("DROP TABLE delivery_retries")
+    
+    def _migrate_team_id(self):
+        """Добавление ссылки на команду (team_id) в старые базы и заполнение её по названию команды.
+        
+        Если команд с таким названием несколько, выбирается та, в которой состоит
+        автор напоминания. Напоминания уже удалённых команд никому не отправлялись
+        и удаляются.
+        """
+        if not self._has_column('reminders_archive', 'team_id'):
+            self.cursor.execute("ALTER TABLE reminders_archive ADD COLUMN team_id INTEGER")
+        if not self._has_column('reminders', 'team_id'):
+            self.cursor.execute(
+                "ALTER TABLE reminders ADD COLUMN team_id INTEGER REFERENCES teams (id) ON DELETE CASCADE"
+            )
+            for table in ('reminders', 'reminders_archive'):
+                self.cursor.execute(f'''
+                UPDATE {table} SET team_id = (
+                    SELECT teams.id FROM teams
+                    LEFT JOIN team_members ON team_members.team_id = teams.id
+                        AND team_members.user_id = {table}.user_id
+                    WHERE teams.name = {table}.team_name
+                    ORDER BY team_members.user_id IS NULL, teams.id
+                    LIMIT 1
+                )
+                WHERE team_id IS NULL AND team_name <> ''
+                ''')
+                logger.info(f"Заполнена ссылка на команду в {table}: {self.cursor.rowcount}")
+            self.cursor.execute(
+                "DELETE FROM reminders WHERE team_id IS NULL AND team_name <> '' RETURNING id"
+            )
+            orphaned = [row['id'] for row in self.cursor.fetchall()]
+            if orphaned:
+                self.cursor.execute(
+                    f"DELETE FROM outbox WHERE reminder_id IN ({self.sql.id_list})",
+                    (json.dumps(orphaned),)
+                )
+                logger.info(f"Удалено напоминаний несуществующих команд: {len(orphaned)}")
+        
+        self.cursor.execute("DROP INDEX IF EXISTS idx_reminders_team_name")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_reminders_archive_team_name")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_reminders_team_id ON reminders (team_id)")
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_reminders_archive_team_id ON reminders_archive (team_id)"
+        )
+    
+    def _create_search_index(self):
+        """Полнотекстовый индекс FTS5 по тексту напоминаний.
+        
+        Индекс хранит только слова (текст берётся из reminders) и обновляется
+        триггерами при добавлении, изменении текста и удалении напоминаний,
+        в том числе каскадном и при переносе в архив.
+        """
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'reminders_fts'")
+        created = self.cursor.fetchone() is None
+        self.cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS reminders_fts USING fts5(
+            reminder_text,
+            content = 'reminders',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        ''')
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS reminders_fts_insert AFTER INSERT ON reminders BEGIN
+            INSERT INTO reminders_fts (rowid, reminder_text) VALUES (new.id, new.reminder_text);
+        END
+        ''')
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS reminders_fts_delete AFTER DELETE ON reminders BEGIN
+            INSERT INTO reminders_fts (reminders_fts, rowid, reminder_text) VALUES ('delete', old.id, old.reminder_text);
+        END
+        ''')
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS reminders_fts_update AFTER UPDATE OF reminder_text ON reminders BEGIN
+            INSERT INTO reminders_fts (reminders_fts, rowid, reminder_text) VALUES ('delete', old.id, old.reminder_text);
+            INSERT INTO reminders_fts (rowid, reminder_text) VALUES (new.id, new.reminder_text);
+        END
+        ''')
+        if created:
+            # Индексируем напоминания, добавленные до появления поиска
+            self.cursor.execute("INSERT INTO reminders_fts (reminders_fts) VALUES ('rebuild')")
+            logger.info("Создан полнотекстовый индекс напоминаний")
+    
+    def _migrate_team_invites(self):
+        """Перенос приглашений из старой таблицы с внешним ключом на teams."""
+        self.cursor.execute('''
+        INSERT INTO team_invites (id, team_id, team_name, invited_username, invited_by, status, created_at)
+        SELECT id, team_id, team_name, invited_username, invited_by, status, created_at FROM team_invites_legacy
+        ''')
+        logger.info(f"Перенесено приглашений в команды: {self.cursor.rowcount}")
+        self.cursor.execute("DROP TABLE team_invites_legacy")
+    
+    def _migrate_shard(self):
+        """Добавление колонки раздела планировщика в старые базы."""
+        if not self._has_column('reminders', 'shard'):
+            self.cursor.execute("ALTER TABLE reminders ADD COLUMN shard INTEGER")
+        self.cursor.execute(
+            "UPDATE reminders SET shard = user_id % ? WHERE shard IS NULL",
+            (SCHEDULER_PARTITIONS,)
+        )
+    
+    def insert_team(self, name, created_by):
+        """Вставка строки команды без участников и без фиксации транзакции.
+        
+        Returns:
+            int: ID команды
+        """
+        if self.legacy_team_members:
+            # Колонка первой версии не читается, но объявлена NOT NULL
+            self.cursor.execute(
+                "INSERT INTO teams (name, members, created_by) VALUES (?, '[]', ?)",
+                (name, created_by)
+            )
+        else:
+            self.cursor.execute("INSERT INTO teams (name, created_by) VALUES (?, ?)", (name, created_by))
+        return self.cursor.lastrowid
+    
     def add_team(self, name, members, created_by):
-        """Добавление новой команды в базу данных."""
+        """Добавление новой команды в базу данных.
+        
+        Returns:
+            int: ID созданной команды или None при ошибке
+        """
         try:
-            # Сохраняем список участников как строку JSON
-            members_json = json.dumps(members)
-            
-            self.cursor.execute(
-                "INSERT INTO teams (name, members, created_by) VALUES (?, ?, ?)",
-                (name, members_json, created_by)
+            team_id = self.insert_team(name, created_by)
+            self.cursor.executemany(
+                "INSERT INTO team_members (team_id, user_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                [(team_id, member) for member in members]
             )
-            self.conn.commit()
+            self._commit()
+            self._user_teams.invalidate(*members)
             logger.info(f"Команда '{name}' успешно добавлена")
-            return True
-        except sqlite3.Error as e:
+            return team_id
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка добавления команды: {e}")
-            return False
+            return None
+    
+    def _get_team_members(self, team_ids):
+        """Участники указанных команд: словарь ID команды -> список ID пользователей."""
+        self.cursor.execute(
+            f"SELECT team_id, user_id FROM team_members WHERE team_id IN ({self.sql.id_list}) "
+            "ORDER BY team_id, joined_at, user_id",
+            (json.dumps(list(team_ids)),)
+        )
+        members = {team_id: [] for team_id in team_ids}
+        for row in self.cursor.fetchall():
+            members[row['team_id']].append(row['user_id'])
+        return members
+    
+    def _load_teams(self, team_ids):
+        """Команды по списку ID: из кэша, а недостающие - одним запросом к базе."""
+        teams = {}
+        missing = []
+        for team_id in team_ids:
+            team = self._teams.get(team_id)
+            if team is LRUCache.MISSING:
+                missing.append(team_id)
+            else:
+                teams[team_id] = team
+        if missing:
+            self.cursor.execute(
+                f"SELECT * FROM teams WHERE id IN ({self.sql.id_list})",
+                (json.dumps(missing),)
+            )
+            rows = self.cursor.fetchall()
+            members = self._get_team_members([row['id'] for row in rows])
+            for row in rows:
+                team = {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'members': members[row['id']],
+                    'created_by': row['created_by']
+                }
+                self._teams.set(row['id'], team)
+                teams[row['id']] = team
+        # Копии, чтобы изменения у вызывающего не попали в кэш
+        return [
+            dict(teams[team_id], members=list(teams[team_id]['members']))
+            for team_id in team_ids if team_id in teams
+        ]
     
     def get_teams(self, user_id=None):
         """Получение списка команд."""
         try:
             if user_id:
                 # Получаем команды, где пользователь является участником
-                self.cursor.execute("SELECT * FROM teams")
-                all_teams = self.cursor.fetchall()
-                
-                user_teams = []
-                for team in all_teams:
-                    members = json.loads(team['members'])
-                    if user_id in members:
-                        user_teams.append({
-                            'id': team['id'],
-                            'name': team['name'],
-                            'members': members,
-                            'created_by': team['created_by']
-                        })
-                
-                return user_teams
+                team_ids = self._user_teams.get(user_id)
+                if team_ids is LRUCache.MISSING:
+                    self.cursor.execute(
+                        "SELECT team_id FROM team_members WHERE user_id = ? ORDER BY team_id",
+                        (user_id,)
+                    )
+                    team_ids = [row['team_id'] for row in self.cursor.fetchall()]
+                    self._user_teams.set(user_id, team_ids)
+                return self._load_teams(team_ids)
             else:
                 # Получаем все команды
                 self.cursor.execute("SELECT * FROM teams")
-                teams = self.cursor.fetchall()
-                
-                return [{
-                    'id': team['id'],
-                    'name': team['name'],
-                    'members': json.loads(team['members']),
-                    'created_by': team['created_by']
-                } for team in teams]
+            teams = self.cursor.fetchall()
+            members = self._get_team_members([team['id'] for team in teams])
+            
+            return [{
+                'id': team['id'],
+                'name': team['name'],
+                'members': members[team['id']],
+                'created_by': team['created_by']
+            } for team in teams]
                 
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка получения команд: {e}")
             return []
     
-    def add_reminder(self, user_id, reminder_time, reminder_text, team_name=None):
-        """Добавление нового напоминания в базу данных."""
+    def _keyset_page(self, sql, params, key, after_id, before_id, limit):
+        """Строки одной страницы списка (keyset-пагинация).
+        
+        Страница выбирается условием на ключ, а не OFFSET, поэтому запрос
+        читает по индексу только строки страницы, сколько бы их ни было всего.
+        
+        Args:
+            sql (str): Запрос с условием WHERE, к которому добавляется условие на ключ
+            params (tuple): Параметры запроса
+            key (str): Колонка, по которой упорядочен список
+            after_id (int): Следующая страница после этого значения ключа
+            before_id (int, optional): Предыдущая страница перед этим значением ключа
+            limit (int): Размер страницы
+            
+        Returns:
+            tuple: (строки по возрастанию ключа, есть ли строки до страницы, есть ли после)
+        """
+        backward = before_id is not None
+        comparison, order, bound = ("<", " DESC", before_id) if backward else (">", "", after_id)
+        self.cursor.execute(
+            f"{sql} AND {key} {comparison} ? ORDER BY {key}{order} LIMIT ?",
+            (*params, bound, limit + 1)
+        )
+        rows = self.cursor.fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        
+        # С другой стороны страницы достаточно проверить одну строку
+        other = False
+        if rows:
+            edge, comparison = (rows[-1][key], ">") if backward else (rows[0][key], "<")
+            self.cursor.execute(f"{sql} AND {key} {comparison} ? LIMIT 1", (*params, edge))
+            other = self.cursor.fetchone() is not None
+        return (rows, more, other) if backward else (rows, other, more)
+    
+    def get_teams_page(self, user_id, after_id=0, before_id=None, limit=10):
+        """Страница команд пользователя по возрастанию ID.
+        
+        Args:
+            user_id (int): ID пользователя
+            after_id (int): Следующая страница после команды с этим ID
+            before_id (int, optional): Предыдущая страница перед командой с этим ID
+            limit (int): Размер страницы
+            
+        Returns:
+            tuple: (команды страницы, есть ли команды до неё, есть ли после)
+        """
         try:
+            rows, has_previous, has_next = self._keyset_page(
+                "SELECT team_id FROM team_members WHERE user_id = ?", (user_id,),
+                "team_id", after_id, before_id, limit
+            )
+            return self._load_teams([row['team_id'] for row in rows]), has_previous, has_next
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения страницы команд: {e}")
+            return [], False, False
+    
+    def add_reminder(self, user_id, reminder_time, reminder_text, team_id=None, recurrence=None):
+        """Добавление нового напоминания в базу данных.
+        
+        Для повторяющегося напоминания (recurrence - правило из recurrence.py)
+        хранится одна строка с ближайшим срабатыванием. Командное напоминание
+        ссылается на команду по team_id; название команды сохраняется для
+        текста сообщений и архива.
+        """
+        try:
+            fire_at = reminder_epoch(reminder_time)
+            shard = reminder_shard(user_id)
             self.cursor.execute(
-                "INSERT INTO reminders (user_id, reminder_time, reminder_text, team_name) VALUES (?, ?, ?, ?)",
-                (user_id, reminder_time, reminder_text, team_name)
+                "INSERT INTO reminders (user_id, reminder_time, reminder_text, team_id, team_name, fire_at, shard, recurrence) "
+                "VALUES (?, ?, ?, ?, (SELECT name FROM teams WHERE id = ?), ?, ?, ?)",
+                (user_id, reminder_time, reminder_text, team_id, team_id, fire_at, shard, recurrence)
             )
-            self.conn.commit()
+            self._commit()
             logger.info(f"Напоминание успешно добавлено для пользователя {user_id}")
+            
+            if self.scheduler:
+                self._after_commit(self.scheduler.schedule, {
+                    'id': self.cursor.lastrowid,
+                    'user_id': user_id,
+                    'reminder_time': reminder_time,
+                    'reminder_text': reminder_text,
+                    'team_id': team_id,
+                    'fire_at': fire_at,
+                    'shard': shard
+                })
             return True
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка добавления напоминания: {e}")
             return False
     
-    def get_reminders(self, user_id=None, team_name=None):
-        """Получение списка напоминаний."""
+    def get_reminders(self, user_id=None, team_id=None, include_archived=False):
+        """Получение списка напоминаний.
+        
+        Args:
+            user_id (int, optional): Фильтр по пользователю
+            team_id (int, optional): Фильтр по команде
+            include_archived (bool): Добавить напоминания из архива
+            
+        Returns:
+            list: Список напоминаний
+        """
+        source = "reminders"
+        if include_archived:
+            source = '''(
+                SELECT id, user_id, reminder_time, reminder_text, team_id, team_name, recurrence, status
+                FROM reminders
+                UNION ALL
+                SELECT id, user_id, reminder_time, archived_text(reminder_text), team_id, team_name, recurrence, status
+                FROM reminders_archive
+            ) AS reminders'''
         try:
-            if user_id and team_name:
+            if user_id and team_id:
                 # Получаем напоминания для пользователя и команды
                 self.cursor.execute(
-                    "SELECT * FROM reminders WHERE user_id = ? AND team_name = ?",
-                    (user_id, team_name)
+                    f"SELECT * FROM {source} WHERE user_id = ? AND team_id = ?",
+                    (user_id, team_id)
                 )
             elif user_id:
                 # Получаем все напоминания пользователя
                 self.cursor.execute(
-                    "SELECT * FROM reminders WHERE user_id = ? OR team_name IN (SELECT name FROM teams WHERE members LIKE ?)",
-                    (user_id, f"%{user_id}%")
+                    f"SELECT * FROM {source} WHERE user_id = ? OR team_id IN ("
+                    "SELECT team_id FROM team_members WHERE user_id = ?)",
+                    (user_id, user_id)
                 )
-            elif team_name:
+            elif team_id:
                 # Получаем напоминания для команды
                 self.cursor.execute(
-                    "SELECT * FROM reminders WHERE team_name = ?",
-                    (team_name,)
+                    f"SELECT * FROM {source} WHERE team_id = ?",
+                    (team_id,)
                 )
             else:
                 # Получаем все напоминания
-                self.cursor.execute("SELECT * FROM reminders")
+                self.cursor.execute(f"SELECT * FROM {source}")
             
             reminders = self.cursor.fetchall()
             
@@ -206,13 +864,458 @@ class Database:
                 'user_id': reminder['user_id'],
                 'reminder_time': reminder['reminder_time'],
                 'reminder_text': reminder['reminder_text'],
-                'team_name': reminder['team_name']
+                'team_id': reminder['team_id'],
+                'team_name': reminder['team_name'],
+                'recurrence': reminder['recurrence'],
+                'status': reminder['status']
             } for reminder in reminders]
             
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка получения напоминаний: {e}")
             return []
     
+    def get_reminders_page(self, user_id, after_id=0, before_id=None, limit=10):
+        """Страница напоминаний пользователя и его команд по возрастанию ID.
+        
+        Args:
+            user_id (int): ID пользователя
+            after_id (int): Следующая страница после напоминания с этим ID
+            before_id (int, optional): Предыдущая страница перед напоминанием с этим ID
+            limit (int): Размер страницы
+            
+        Returns:
+            tuple: (напоминания страницы, есть ли напоминания до неё, есть ли после)
+        """
+        try:
+            reminders, has_previous, has_next = self._keyset_page(
+                "SELECT * FROM reminders WHERE (user_id = ? OR team_id IN ("
+                "SELECT team_id FROM team_members WHERE user_id = ?))", (user_id, user_id),
+                "id", after_id, before_id, limit
+            )
+            
+            return [{
+                'id': reminder['id'],
+                'user_id': reminder['user_id'],
+                'reminder_time': reminder['reminder_time'],
+                'reminder_text': reminder['reminder_text'],
+                'team_id': reminder['team_id'],
+                'team_name': reminder['team_name'],
+                'recurrence': reminder['recurrence'],
+                'status': reminder['status']
+            } for reminder in reminders], has_previous, has_next
+            
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения страницы напоминаний: {e}")
+            return [], False, False
+    
+    def search_reminders(self, text, user_id=None, limit=20):
+        """Полнотекстовый поиск напоминаний, самые релевантные первыми.
+        
+        Ищутся напоминания, содержащие все слова запроса (слово может быть началом
+        слова в тексте).
+        
+        Args:
+            text (str): Текст запроса
+            user_id (int, optional): Только напоминания пользователя и его команд
+            limit (int): Максимальное количество напоминаний
+            
+        Returns:
+            list: Список напоминаний
+        """
+        query = self.sql.search_query(text)
+        if not query:
+            return []
+        try:
+            user_sql, user_params = "", ()
+            if user_id:
+                user_sql = (
+                    " AND (reminders.user_id = ? OR reminders.team_id IN ("
+                    "SELECT team_id FROM team_members WHERE user_id = ?))"
+                )
+                user_params = (user_id, user_id)
+            self.cursor.execute(
+                f"SELECT reminders.* FROM {self.sql.search_source} WHERE {self.sql.search_match}{user_sql} "
+                f"ORDER BY {self.sql.search_rank} LIMIT ?",
+                (query, *user_params, limit)
+            )
+            reminders = self.cursor.fetchall()
+            
+            return [{
+                'id': reminder['id'],
+                'user_id': reminder['user_id'],
+                'reminder_time': reminder['reminder_time'],
+                'reminder_text': reminder['reminder_text'],
+                'team_id': reminder['team_id'],
+                'team_name': reminder['team_name'],
+                'recurrence': reminder['recurrence'],
+                'status': reminder['status']
+            } for reminder in reminders]
+            
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка поиска напоминаний: {e}")
+            return []
+    
+    def _shard_filter(self, shards):
+        """Условие отбора по разделам планировщика и его параметры."""
+        if shards is None:
+            return "", ()
+        return f" AND shard IN ({self.sql.id_list})", (json.dumps(sorted(shards)),)
+    
+    def get_due_reminders(self, from_ts, to_ts, limit=-1, shards=None):
+        """Получение неотправленных напоминаний, время которых попадает в интервал [from_ts, to_ts).
+        
+        Args:
+            from_ts (int): Начало интервала (UTC epoch, включительно)
+            to_ts (int): Конец интервала (UTC epoch, не включительно)
+            limit (int, optional): Максимальное количество напоминаний
+            shards (iterable, optional): Только напоминания из этих разделов планировщика
+            
+        Returns:
+            list: Список напоминаний, отсортированный по времени срабатывания
+        """
+        try:
+            shard_sql, shard_params = self._shard_filter(shards)
+            # Отрицательный limit - без ограничения
+            limit_sql, limit_params = (" LIMIT ?", (limit,)) if limit >= 0 else ("", ())
+            self.cursor.execute(
+                "SELECT * FROM reminders WHERE status = 'pending' AND fire_at >= ? AND fire_at < ?"
+                + shard_sql + " ORDER BY fire_at, id" + limit_sql,
+                (from_ts, to_ts, *shard_params, *limit_params)
+            )
+            reminders = self.cursor.fetchall()
+            
+            return [{
+                'id': reminder['id'],
+                'user_id': reminder['user_id'],
+                'reminder_time': reminder['reminder_time'],
+                'reminder_text': reminder['reminder_text'],
+                'team_id': reminder['team_id'],
+                'team_name': reminder['team_name'],
+                'fire_at': reminder['fire_at'],
+                'shard': reminder['shard']
+            } for reminder in reminders]
+            
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения напоминаний за интервал: {e}")
+            return []
+    
+    def get_reminders_after(self, after_id, limit=1000):
+        """Получение напоминаний, добавленных после указанного ID (в том числе другими процессами).
+        
+        Args:
+            after_id (int): ID последнего уже известного напоминания
+            limit (int, optional): Максимальное количество напоминаний
+            
+        Returns:
+            list: Список напоминаний, отсортированный по ID
+        """
+        try:
+            self.cursor.execute(
+                "SELECT * FROM reminders WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            )
+            reminders = self.cursor.fetchall()
+            
+            return [{
+                'id': reminder['id'],
+                'user_id': reminder['user_id'],
+                'reminder_time': reminder['reminder_time'],
+                'reminder_text': reminder['reminder_text'],
+                'team_id': reminder['team_id'],
+                'team_name': reminder['team_name'],
+                'fire_at': reminder['fire_at'],
+                'shard': reminder['shard'],
+                'status': reminder['status']
+            } for reminder in reminders]
+            
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения новых напоминаний: {e}")
+            return []
+    
+    def get_max_reminder_id(self):
+        """ID последнего добавленного напоминания (0, если напоминаний нет)."""
+        try:
+            self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM reminders")
+            return self.cursor.fetchone()[0]
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения последнего ID напоминания: {e}")
+            return 0
+    
+    def enqueue_reminders(self, due):
+        """Перевод сработавших напоминаний в очередь отправки (outbox).
+        
+        В одной транзакции напоминания отмечаются обработанными (разовые получают
+        статус sent, повторяющиеся переносятся на следующее срабатывание), а в outbox
+        записываются готовые сообщения для каждого получателя. Участники команд и
+        текст сообщений вычисляются одним SQL-запросом. Напоминания, уже
+        обработанные (или перенесённые) этим или другим процессом, пропускаются.
+        
+        Args:
+            due (iterable): Пары (ID напоминания, время срабатывания), которое наступило
+            
+        Returns:
+            list: Повторяющиеся напоминания с новым временем срабатывания
+        """
+        now = int(datetime.now().timestamp())
+        due = dict(due)
+        try:
+            self.cursor.execute(
+                f"SELECT * FROM reminders WHERE id IN ({self.sql.id_list}) AND status = 'pending'",
+                (json.dumps(list(due)),)
+            )
+            enqueued = []
+            rescheduled = []
+            for reminder in self.cursor.fetchall():
+                # Срабатывание уже обработано: повторяющееся напоминание перенесено
+                # (например, устаревшей записью в куче после переезда раздела)
+                if reminder['fire_at'] != due[reminder['id']]:
+                    continue
+                if not reminder['recurrence']:
+                    self.cursor.execute(
+                        "UPDATE reminders SET status = 'sent', sent_at = ? WHERE id = ? AND status = 'pending'",
+                        (now, reminder['id'])
+                    )
+                    if self.cursor.rowcount:
+                        enqueued.append([reminder['id'], reminder['fire_at']])
+                    continue
+                
+                try:
+                    previous = datetime.fromisoformat(reminder['reminder_time'])
+                    next_time = next_occurrence(reminder['recurrence'], previous).isoformat()
+                except ValueError as e:
+                    logger.error(f"Не удалось вычислить следующее срабатывание напоминания {reminder['id']}: {e}")
+                    self.cursor.execute(
+                        "UPDATE reminders SET status = 'failed', failed_at = ? WHERE id = ?",
+                        (now, reminder['id'])
+                    )
+                    continue
+                
+                fire_at = reminder_epoch(next_time)
+                # Переносим только с наступившего срабатывания: другой процесс мог
+                # перенести напоминание после чтения
+                self.cursor.execute(
+                    "UPDATE reminders SET reminder_time = ?, fire_at = ?, sent_at = ? "
+                    "WHERE id = ? AND status = 'pending' AND fire_at = ?",
+                    (next_time, fire_at, now, reminder['id'], due[reminder['id']])
+                )
+                if self.cursor.rowcount:
+                    enqueued.append([reminder['id'], reminder['fire_at']])
+                    rescheduled.append({
+                        'id': reminder['id'],
+                        'user_id': reminder['user_id'],
+                        'reminder_time': next_time,
+                        'reminder_text': reminder['reminder_text'],
+                        'team_id': reminder['team_id'],
+                        'team_name': reminder['team_name'],
+                        'fire_at': fire_at,
+                        'shard': reminder['shard']
+                    })
+            
+            # Командное напоминание без участников не даёт ни одного сообщения
+            self.cursor.execute(f'''
+            INSERT INTO outbox (reminder_id, chat_id, text, fire_at, next_attempt_at)
+            WITH due AS (
+                -- Время срабатывания берём до переноса повторяющихся напоминаний
+                SELECT reminders.id, user_id, team_id, team_name, reminder_text, enqueued.fire_at
+                FROM ({self.sql.json_rows('id', 'fire_at')}) AS enqueued
+                JOIN reminders ON reminders.id = enqueued.id
+            ),
+            messages AS (
+                SELECT due.id AS reminder_id, due.user_id AS chat_id,
+                       {self.sql.format_function}(?, due.reminder_text) AS text, due.fire_at
+                FROM due
+                WHERE due.team_id IS NULL
+                UNION ALL
+                SELECT due.id AS reminder_id, member.user_id AS chat_id,
+                       {self.sql.format_function}(?, due.team_name, due.reminder_text) AS text, due.fire_at
+                FROM due
+                JOIN team_members AS member ON member.team_id = due.team_id
+            )
+            SELECT reminder_id, chat_id, text, fire_at, ? FROM messages
+            ORDER BY fire_at, reminder_id
+            ''', (json.dumps(enqueued), PERSONAL_REMINDER_TEMPLATE, TEAM_REMINDER_TEMPLATE, now))
+            self._commit()
+            
+            if enqueued:
+                logger.info(f"В очередь отправки поставлено напоминаний: {len(enqueued)}, сообщений: {self.cursor.rowcount}")
+            return rescheduled
+        except DATABASE_ERRORS as e:
+            # Ни статусы, ни сообщения не должны записаться частично
+            self._rollback()
+            logger.error(f"Ошибка постановки напоминаний в очередь отправки: {e}")
+            return []
+    
+    def claim_outbox(self, limit, claim_timeout):
+        """Захват сообщений outbox, время отправки которых наступило.
+        
+        Время следующей попытки захваченных сообщений сдвигается на claim_timeout
+        секунд: если отправитель упадёт, сообщения будут отправлены повторно после
+        этого срока. Несколько отправителей не получат одно сообщение одновременно.
+        
+        Args:
+            limit (int): Максимальное количество сообщений
+            claim_timeout (int): На сколько секунд захватываются сообщения
+            
+        Returns:
+            list: Список захваченных сообщений
+        """
+        now = datetime.now().timestamp()
+        try:
+            # Условие на время повторяется: строку мог только что захватить другой отправитель
+            self.cursor.execute(f'''
+            UPDATE outbox SET next_attempt_at = ?
+            WHERE id IN (
+                SELECT id FROM outbox WHERE next_attempt_at <= ?
+                ORDER BY next_attempt_at, id LIMIT ?{self.sql.skip_locked}
+            ) AND next_attempt_at <= ?
+            RETURNING id, reminder_id, chat_id, text, fire_at, attempts
+            ''', (now + claim_timeout, now, limit, now))
+            messages = [{
+                'id': message['id'],
+                'reminder_id': message['reminder_id'],
+                'chat_id': message['chat_id'],
+                'text': message['text'],
+                'fire_at': message['fire_at'],
+                'attempts': message['attempts']
+            } for message in self.cursor.fetchall()]
+            self._commit()
+            
+            return sorted(messages, key=lambda message: message['id'])
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения сообщений из очереди отправки: {e}")
+            return []
+    
+    def reschedule_outbox(self, message_ids, attempts, next_attempt_at, last_error):
+        """Перенос отправки сообщений outbox после временной ошибки.
+        
+        Args:
+            message_ids (list): ID сообщений
+            attempts (list): Новое количество попыток для каждого сообщения
+            next_attempt_at (float): Время следующей попытки (timestamp)
+            last_error (str): Текст ошибки
+            
+        Returns:
+            bool: Успех операции
+        """
+        try:
+            self.cursor.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                [(count, next_attempt_at, last_error, message_id) for message_id, count in zip(message_ids, attempts)]
+            )
+            self._commit()
+            return True
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка переноса отправки сообщений: {e}")
+            return False
+    
+    def truncate_outbox(self, message_id, text):
+        """Замена текста сообщения outbox его неотправленным остатком.
+        
+        Args:
+            message_id (int): ID сообщения
+            text (str): Ещё не доставленная часть текста
+            
+        Returns:
+            bool: Успех операции
+        """
+        try:
+            self.cursor.execute("UPDATE outbox SET text = ? WHERE id = ?", (text, message_id))
+            self._commit()
+            return True
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка обновления текста сообщения {message_id}: {e}")
+            return False
+    
+    def complete_outbox(self, message_ids, failed_reminder_ids=()):
+        """Удаление обработанных сообщений из outbox.
+        
+        Args:
+            message_ids (list): ID сообщений
+            failed_reminder_ids (iterable, optional): Напоминания, сообщения которых не доставлены;
+                разовые из них получают статус failed
+            
+        Returns:
+            bool: Успех операции
+        """
+        try:
+            self.cursor.executemany("DELETE FROM outbox WHERE id = ?", [(message_id,) for message_id in message_ids])
+            now = int(datetime.now().timestamp())
+            self.cursor.executemany(
+                "UPDATE reminders SET status = 'failed', failed_at = ? WHERE id = ? AND recurrence IS NULL",
+                [(now, reminder_id) for reminder_id in set(failed_reminder_ids)]
+            )
+            self._commit()
+            return True
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка удаления сообщений из очереди отправки: {e}")
+            return False
+    
+    def archive_reminders(self, delivered_before, expired_before, limit=500, compress=False):
+        """Перенос пачки обработанных напоминаний в архив.
+        
+        Переносятся разовые напоминания со статусом sent/failed, отправленные (или
+        неотправленные) раньше delivered_before, и неотправленные разовые, просроченные
+        раньше expired_before (в архиве у них статус expired). Напоминания, сообщения
+        которых ещё ждут отправки в outbox, не переносятся: иначе отправитель отметит
+        неудачу уже в архивной записи.
+        
+        Args:
+            delivered_before (float): Граница для обработанных напоминаний (timestamp)
+            expired_before (float): Граница для неотправленных напоминаний (timestamp)
+            limit (int): Максимальное количество напоминаний за раз
+            compress (bool): Сжимать ли текст напоминаний
+            
+        Returns:
+            int: Количество перенесённых напоминаний
+        """
+        try:
+            self.cursor.execute('''
+            SELECT id FROM reminders
+            WHERE ((status = 'sent' AND COALESCE(sent_at, fire_at) < ?)
+                OR (status = 'failed' AND COALESCE(failed_at, fire_at) < ?)
+                OR (status = 'pending' AND recurrence IS NULL AND fire_at < ?))
+              AND NOT EXISTS (SELECT 1 FROM outbox WHERE outbox.reminder_id = reminders.id)
+            LIMIT ?
+            ''', (delivered_before, delivered_before, expired_before, limit))
+            ids = json.dumps([row['id'] for row in self.cursor.fetchall()])
+            
+            self.cursor.execute(f'''
+            INSERT INTO reminders_archive (
+                id, user_id, reminder_time, reminder_text, team_id, team_name, recurrence,
+                status, fire_at, sent_at, failed_at, created_at, archived_at
+            )
+            SELECT id, user_id, reminder_time,
+                   CASE WHEN ? THEN archive_text(reminder_text) ELSE reminder_text END,
+                   team_id, team_name, recurrence,
+                   CASE status WHEN 'pending' THEN 'expired' ELSE status END,
+                   fire_at, sent_at, failed_at, created_at, ?
+            FROM reminders WHERE id IN ({self.sql.id_list})
+            ON CONFLICT (id) DO UPDATE SET
+                user_id = excluded.user_id, reminder_time = excluded.reminder_time,
+                reminder_text = excluded.reminder_text, team_id = excluded.team_id, team_name = excluded.team_name,
+                recurrence = excluded.recurrence, status = excluded.status, fire_at = excluded.fire_at,
+                sent_at = excluded.sent_at, failed_at = excluded.failed_at,
+                created_at = excluded.created_at, archived_at = excluded.archived_at
+            ''', (compress, int(datetime.now().timestamp()), ids))
+            moved = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM reminders WHERE id IN ({self.sql.id_list})", (ids,))
+            self._commit()
+            return moved
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка переноса напоминаний в архив: {e}")
+            return 0
+    
     def add_team_invite(self, team_id, team_name, invited_username, invited_by):
         """Добавление приглашения в команду.
         
@@ -230,13 +1333,48 @@ class Database:
                 "INSERT INTO team_invites (team_id, team_name, invited_username, invited_by) VALUES (?, ?, ?, ?)",
                 (team_id, team_name, invited_username, invited_by)
             )
-            self.conn.commit()
+            self._commit()
+            self._after_commit(self._pending_invites.invalidate, invited_username)
             invite_id = self.cursor.lastrowid
             logger.info(f"Создано приглашение #{invite_id} для пользователя {invited_username} в команду {team_name}")
             return invite_id
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка создания приглашения: {e}")
             return None
+    
+    def add_team_invites(self, team_id, team_name, invited_usernames, invited_by):
+        """Добавление приглашений в команду для нескольких пользователей одним запросом.
+        
+        Args:
+            team_id (int): ID команды
+            team_name (str): Название команды
+            invited_usernames (list): Username приглашаемых
+            invited_by (int): ID пользователя, отправившего приглашения
+            
+        Returns:
+            list: Созданные приглашения: словари с id и invited_username (пустой список при ошибке)
+        """
+        if not invited_usernames:
+            return []
+        try:
+            self.cursor.execute(
+                "INSERT INTO team_invites (team_id, team_name, invited_username, invited_by) "
+                f"SELECT ?, ?, value, ? FROM ({self.sql.text_list}) AS invited RETURNING id, invited_username",
+                (team_id, team_name, invited_by, json.dumps(list(invited_usernames)))
+            )
+            invites = [
+                {'id': row['id'], 'invited_username': row['invited_username']}
+                for row in self.cursor.fetchall()
+            ]
+            self._commit()
+            self._after_commit(self._pending_invites.invalidate, *invited_usernames)
+            logger.info(f"Создано приглашений в команду {team_name}: {len(invites)}")
+            return invites
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка создания приглашений: {e}")
+            return []
             
     def get_pending_invites(self, username=None):
         """Получение ожидающих приглашений.
@@ -267,9 +1405,84 @@ class Database:
                 'created_at': invite['created_at']
             } for invite in invites]
             
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка получения приглашений: {e}")
             return []
+    
+    def count_pending_invites(self, username):
+        """Количество ожидающих приглашений пользователя (с кэшем).
+        
+        Args:
+            username (str): Username пользователя
+            
+        Returns:
+            int: Количество приглашений
+        """
+        count = self._pending_invites.get(username)
+        if count is not LRUCache.MISSING:
+            return count
+        try:
+            self.cursor.execute(
+                "SELECT COUNT(*) FROM team_invites WHERE invited_username = ? AND status = 'pending'",
+                (username,)
+            )
+            count = self.cursor.fetchone()[0]
+            self._pending_invites.set(username, count)
+            return count
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка подсчёта приглашений: {e}")
+            return 0
+    
+    def save_user(self, user_id, username, chat_id):
+        """Сохранение username и чата пользователя.
+        
+        Args:
+            user_id (int): ID пользователя
+            username (str): Username пользователя (может отсутствовать)
+            chat_id (int): ID личного чата с ботом
+            
+        Returns:
+            bool: Успех операции
+        """
+        # Username в Telegram не зависит от регистра; храним в нижнем регистре
+        if username:
+            username = username.lower()
+        try:
+            self.cursor.execute(
+                "INSERT INTO users (user_id, username, chat_id) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, "
+                "chat_id = excluded.chat_id, updated_at = CURRENT_TIMESTAMP",
+                (user_id, username, chat_id)
+            )
+            self._commit()
+            return True
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка сохранения пользователя: {e}")
+            return False
+    
+    def get_user_chats(self, usernames):
+        """Чаты известных боту пользователей по username.
+        
+        Args:
+            usernames (list): Username пользователей
+            
+        Returns:
+            dict: Username (как передан) -> ID чата; неизвестные пользователи пропускаются
+        """
+        try:
+            self.cursor.execute(
+                f"SELECT username, chat_id FROM users WHERE username IN ({self.sql.text_list})",
+                (json.dumps([username.lower() for username in usernames]),)
+            )
+            chats = {row['username']: row['chat_id'] for row in self.cursor.fetchall()}
+            return {username: chats[username.lower()] for username in usernames if username.lower() in chats}
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения чатов пользователей: {e}")
+            return {}
             
     def update_invite_status(self, invite_id, status):
         """Обновление статуса приглашения.
@@ -283,13 +1496,16 @@ class Database:
         """
         try:
             self.cursor.execute(
-                "UPDATE team_invites SET status = ? WHERE id = ?",
+                "UPDATE team_invites SET status = ? WHERE id = ? RETURNING invited_username",
                 (status, invite_id)
             )
-            self.conn.commit()
+            usernames = [row['invited_username'] for row in self.cursor.fetchall()]
+            self._commit()
+            self._after_commit(self._pending_invites.invalidate, *usernames)
             logger.info(f"Статус приглашения #{invite_id} изменен на {status}")
             return True
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка обновления статуса приглашения: {e}")
             return False
             
@@ -304,35 +1520,28 @@ class Database:
             bool: Успех операции
         """
         try:
-            # Получаем текущий список участников
-            self.cursor.execute("SELECT members FROM teams WHERE id = ?", (team_id,))
-            team = self.cursor.fetchone()
-            
-            if not team:
+            self.cursor.execute("SELECT id FROM teams WHERE id = ?", (team_id,))
+            if not self.cursor.fetchone():
                 logger.error(f"Команда с ID {team_id} не найдена")
                 return False
                 
-            members = json.loads(team['members'])
+            self.cursor.execute(
+                "INSERT INTO team_members (team_id, user_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                (team_id, user_id)
+            )
+            self._commit()
+            self._teams.invalidate(team_id)
+            self._user_teams.invalidate(user_id)
             
-            # Проверяем, не состоит ли пользователь уже в команде
-            if user_id in members:
+            # Проверяем, не состоял ли пользователь уже в команде
+            if not self.cursor.rowcount:
                 logger.info(f"Пользователь {user_id} уже состоит в команде {team_id}")
                 return True
-                
-            # Добавляем пользователя в список
-            members.append(user_id)
-            members_json = json.dumps(members)
-            
-            # Обновляем список участников команды
-            self.cursor.execute(
-                "UPDATE teams SET members = ? WHERE id = ?",
-                (members_json, team_id)
-            )
-            self.conn.commit()
             logger.info(f"Пользователь {user_id} добавлен в команду {team_id}")
             return True
             
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка добавления пользователя в команду: {e}")
             return False
             
@@ -347,36 +1556,28 @@ class Database:
             bool: Успех операции
         """
         try:
-            # Получаем текущий список участников и данные о команде
-            self.cursor.execute("SELECT members, created_by FROM teams WHERE id = ?", (team_id,))
-            team = self.cursor.fetchone()
-            
-            if not team:
+            self.cursor.execute("SELECT id FROM teams WHERE id = ?", (team_id,))
+            if not self.cursor.fetchone():
                 logger.error(f"Команда с ID {team_id} не найдена")
                 return False
                 
-            members = json.loads(team['members'])
-            created_by = team['created_by']
+            self.cursor.execute(
+                "DELETE FROM team_members WHERE team_id = ? AND user_id = ?",
+                (team_id, user_id)
+            )
+            self._commit()
+            self._teams.invalidate(team_id)
+            self._user_teams.invalidate(user_id)
             
-            # Проверяем, состоит ли пользователь в команде
-            if user_id not in members:
+            # Проверяем, состоял ли пользователь в команде
+            if not self.cursor.rowcount:
                 logger.info(f"Пользователь {user_id} не состоит в команде {team_id}")
                 return True
-                
-            # Удаляем пользователя из списка
-            members.remove(user_id)
-            members_json = json.dumps(members)
-            
-            # Обновляем список участников команды
-            self.cursor.execute(
-                "UPDATE teams SET members = ? WHERE id = ?",
-                (members_json, team_id)
-            )
-            self.conn.commit()
             logger.info(f"Пользователь {user_id} удален из команды {team_id}")
             return True
             
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка удаления пользователя из команды: {e}")
             return False
             
@@ -391,12 +1592,59 @@ class Database:
         """
         try:
             self.cursor.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
-            self.conn.commit()
+            self.cursor.execute("DELETE FROM outbox WHERE reminder_id = ?", (reminder_id,))
+            self._commit()
             logger.info(f"Напоминание {reminder_id} удалено")
+            
+            if self.scheduler:
+                self._after_commit(self.scheduler.cancel, reminder_id)
             return True
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка удаления напоминания: {e}")
             return False
+    
+    def delete_reminders(self, user_id=None, team_id=None):
+        """Удаление всех напоминаний пользователя и/или команды одной транзакцией.
+        
+        Args:
+            user_id (int, optional): Фильтр по пользователю
+            team_id (int, optional): Фильтр по команде
+            
+        Returns:
+            int: Количество удалённых напоминаний
+        """
+        conditions, params = [], []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if team_id:
+            conditions.append("team_id = ?")
+            params.append(team_id)
+        if not conditions:
+            # Без фильтра удалились бы все напоминания
+            return 0
+        try:
+            self.cursor.execute(
+                f"DELETE FROM reminders WHERE {' AND '.join(conditions)} RETURNING id",
+                params
+            )
+            reminder_ids = [row['id'] for row in self.cursor.fetchall()]
+            self.cursor.execute(
+                f"DELETE FROM outbox WHERE reminder_id IN ({self.sql.id_list})",
+                (json.dumps(reminder_ids),)
+            )
+            self._commit()
+            logger.info(f"Удалено напоминаний: {len(reminder_ids)}")
+            
+            if self.scheduler:
+                for reminder_id in reminder_ids:
+                    self._after_commit(self.scheduler.cancel, reminder_id)
+            return len(reminder_ids)
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка удаления напоминаний: {e}")
+            return 0
             
     def delete_team(self, team_id):
         """Удаление команды.
@@ -414,22 +1662,38 @@ class Database:
                 logger.error(f"Команда с ID {team_id} не найдена")
                 return False
                 
-            # Удаляем связанные напоминания
-            self.cursor.execute("DELETE FROM reminders WHERE team_name = ?", (team['name'],))
+            # Сообщения напоминаний команды в outbox удаляем сами
+            self.cursor.execute("SELECT id FROM reminders WHERE team_id = ?", (team_id,))
+            reminder_ids = [row['id'] for row in self.cursor.fetchall()]
+            self.cursor.execute(
+                f"DELETE FROM outbox WHERE reminder_id IN ({self.sql.id_list})",
+                (json.dumps(reminder_ids),)
+            )
             
-            # Удаляем команду
+            # Удаляем команду и её участников; напоминания команды удаляются каскадно
+            self.cursor.execute("DELETE FROM team_members WHERE team_id = ?", (team_id,))
             self.cursor.execute("DELETE FROM teams WHERE id = ?", (team_id,))
             
             # Отменяем все приглашения в эту команду
             self.cursor.execute(
-                "UPDATE team_invites SET status = 'canceled' WHERE team_id = ? AND status = 'pending'", 
+                "UPDATE team_invites SET status = 'canceled' WHERE team_id = ? AND status = 'pending' "
+                "RETURNING invited_username",
                 (team_id,)
             )
+            invited_usernames = [row['invited_username'] for row in self.cursor.fetchall()]
             
-            self.conn.commit()
+            self._commit()
+            self._pending_invites.invalidate(*invited_usernames)
+            self._teams.invalidate(team_id)
+            self._user_teams.invalidate(*team['members'])
             logger.info(f"Команда {team_id} удалена")
+            
+            if self.scheduler:
+                for reminder_id in reminder_ids:
+                    self.scheduler.cancel(reminder_id)
             return True
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка удаления команды: {e}")
             return False
             
@@ -443,20 +1707,11 @@ class Database:
             dict: Информация о команде или None при ошибке
         """
         try:
-            self.cursor.execute("SELECT * FROM teams WHERE id = ?", (team_id,))
-            team = self.cursor.fetchone()
+            teams = self._load_teams([team_id])
+            return teams[0] if teams else None
             
-            if not team:
-                return None
-                
-            return {
-                'id': team['id'],
-                'name': team['name'],
-                'members': json.loads(team['members']),
-                'created_by': team['created_by']
-            }
-            
-        except sqlite3.Error as e:
+        except DATABASE_ERRORS as e:
+            self._rollback()
             logger.error(f"Ошибка получения информации о команде: {e}")
             return None
             
@@ -486,21 +1741,369 @@ class Database:
                 'created_at': invite['created_at']
             }
             
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка получения информации о приглашении: {e}")
-            return None
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка получения информации о приглашении: {e}")
+            return None
+    
+    def heartbeat_worker(self, worker_id, ttl):
+        """Отметка о том, что процесс планировщика жив.
+        
+        Args:
+            worker_id (str): Идентификатор процесса планировщика
+            ttl (int): Через сколько секунд без отметок процесс считается упавшим
+            
+        Returns:
+            int: Количество живых процессов планировщика
+        """
+        now = int(datetime.now().timestamp())
+        try:
+            self.cursor.execute(
+                "INSERT INTO scheduler_workers (worker_id, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker_id, now)
+            )
+            self.cursor.execute("DELETE FROM scheduler_workers WHERE heartbeat_at < ?", (now - ttl,))
+            self._commit()
+            self.cursor.execute("SELECT COUNT(*) FROM scheduler_workers")
+            return self.cursor.fetchone()[0]
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка обновления отметки процесса планировщика: {e}")
+            return 1
+    
+    def renew_leases(self, worker_id, ttl):
+        """Продление аренды разделов, которыми владеет процесс.
+        
+        Args:
+            worker_id (str): Идентификатор процесса планировщика
+            ttl (int): Срок аренды в секундах
+            
+        Returns:
+            set: Разделы, которыми процесс владеет после продления, или None при ошибке
+        """
+        now = int(datetime.now().timestamp())
+        try:
+            self.cursor.execute(
+                "UPDATE scheduler_leases SET expires_at = ? WHERE owner = ?",
+                (now + ttl, worker_id)
+            )
+            self._commit()
+            self.cursor.execute("SELECT shard FROM scheduler_leases WHERE owner = ?", (worker_id,))
+            return {row['shard'] for row in self.cursor.fetchall()}
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка продления аренды разделов: {e}")
+            return None
+    
+    def claim_leases(self, worker_id, count, ttl):
+        """Захват свободных или просроченных разделов.
+        
+        Args:
+            worker_id (str): Идентификатор процесса планировщика
+            count (int): Сколько разделов захватить
+            ttl (int): Срок аренды в секундах
+            
+        Returns:
+            set: Захваченные разделы
+        """
+        now = int(datetime.now().timestamp())
+        try:
+            self.cursor.execute(
+                "SELECT shard FROM scheduler_leases WHERE owner IS NULL OR expires_at < ? ORDER BY shard LIMIT ?",
+                (now, count)
+            )
+            candidates = [row['shard'] for row in self.cursor.fetchall()]
+            claimed = set()
+            for shard in candidates:
+                # Условие повторяется, чтобы не отнять раздел, захваченный другим процессом
+                self.cursor.execute(
+                    "UPDATE scheduler_leases SET owner = ?, expires_at = ? "
+                    "WHERE shard = ? AND (owner IS NULL OR expires_at < ?)",
+                    (worker_id, now + ttl, shard, now)
+                )
+                if self.cursor.rowcount:
+                    claimed.add(shard)
+            self._commit()
+            return claimed
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка захвата разделов: {e}")
+            return set()
+    
+    def release_leases(self, worker_id, shards=None):
+        """Освобождение разделов (всех, если shards не указаны).
+        
+        Args:
+            worker_id (str): Идентификатор процесса планировщика
+            shards (iterable, optional): Освобождаемые разделы
+            
+        Returns:
+            bool: Успех операции
+        """
+        try:
+            if shards is None:
+                self.cursor.execute(
+                    "UPDATE scheduler_leases SET owner = NULL, expires_at = 0 WHERE owner = ?",
+                    (worker_id,)
+                )
+                self.cursor.execute("DELETE FROM scheduler_workers WHERE worker_id = ?", (worker_id,))
+            else:
+                self.cursor.executemany(
+                    "UPDATE scheduler_leases SET owner = NULL, expires_at = 0 WHERE owner = ? AND shard = ?",
+                    [(worker_id, shard) for shard in shards]
+                )
+            self._commit()
+            return True
+        except DATABASE_ERRORS as e:
+            self._rollback()
+            logger.error(f"Ошибка освобождения разделов: {e}")
+            return False
+    
+    def _commit(self):
+        """Фиксация транзакции. Внутри пакетной записи откладывается до конца пакета."""
+        if not self._in_batch:
+            self.conn.commit()
+    
+    def _rollback(self):
+        """Откат транзакции после ошибки. Внутри пакетной записи неудачную операцию откатывает run_batch."""
+        if not self._in_batch:
+            self.conn.rollback()
+    
+    def _after_commit(self, action, *args):
+        """Действие после фиксации транзакции (планировщик, кэш).
+        
+        Внутри пакетной записи откладывается до фиксации пакета: планировщик и
+        кэш не должны узнать об операции, которая ещё может откатиться.
+        """
+        if self._in_batch:
+            self._deferred.append((action, args))
+        else:
+            action(*args)
+    
+    def run_batch(self, operations):
+        """Выполнение нескольких операций записи одной транзакцией (group commit).
+        
+        Каждая операция выполняется в своей точке сохранения: неудачная операция
+        откатывается, не затрагивая остальные. Планировщик и кэш обновляются
+        после фиксации пакета и только для успешных операций.
+        
+        Args:
+            operations (list): Тройки (имя метода, args, kwargs)
+            
+        Returns:
+            list: Результат каждой операции
+        """
+        results = []
+        self._deferred = []
+        self._in_batch = True
+        try:
+            self.conn.commit()
+            self.cursor.execute("BEGIN")
+            for name, args, kwargs in operations:
+                deferred = len(self._deferred)
+                self.cursor.execute("SAVEPOINT batch_operation")
+                try:
+                    result = getattr(self, name)(*args, **kwargs)
+                except Exception as e:
+                    # Например, ValueError из-за некорректного времени: ошибка только у этой операции
+                    logger.error(f"Ошибка операции {name} в пакетной записи: {e}")
+                    result = GROUP_COMMIT_METHODS[name]
+                if result == GROUP_COMMIT_METHODS[name]:
+                    self.cursor.execute("ROLLBACK TO batch_operation")
+                    del self._deferred[deferred:]
+                self.cursor.execute("RELEASE batch_operation")
+                results.append(result)
+            self.conn.commit()
+        except Exception as e:
+            # Незафиксированные операции не должны попасть в базу со следующей записью
+            self.conn.rollback()
+            logger.error(f"Ошибка пакетной записи: {e}")
+            return [GROUP_COMMIT_METHODS[name] for name, _, _ in operations]
+        finally:
+            self._in_batch = False
+            deferred, self._deferred = self._deferred, []
+        
+        for action, args in deferred:
+            action(*args)
+        return results
+    
+    def checkpoint(self, mode="PASSIVE"):
+        """Перенос журнала WAL в основной файл базы (см. storage.checkpoint)."""
+        return self.backend.checkpoint(self.conn, mode)
+    
+    def cache_stats(self):
+        """Попадания и промахи кэшей базы данных."""
+        return {
+            'teams': self._teams.stats(),
+            'user_teams': self._user_teams.stats(),
+            'pending_invites': self._pending_invites.stats()
+        }
     
     def close(self):
         """Закрытие соединения с базой данных."""
+        logger.info(f"Кэши базы данных: {self.cache_stats()}")
         if self.conn:
+            try:
+                # Журнал WAL не растёт между запусками
+                self.backend.checkpoint(self.conn, "TRUNCATE")
+            except DATABASE_ERRORS as e:
+                logger.warning(f"Не удалось выполнить checkpoint при закрытии базы: {e}")
             self.conn.close()
+            self.backend.close()
             logger.info("Соединение с базой данных закрыто")
 
-# Инициализация базы данных
-db = Database()
+# Инициализация базы данных. Обработчики и фоновые задачи работают с ней через
+# db (await db.метод(...)): запросы выполняются в отдельном потоке базы
+database = Database(
+    cache_size=config.get("team_cache_size", 1024),
+    cache_ttl=config.get("team_cache_ttl", 300),
+    # SQLite по умолчанию или PostgreSQL ("database" в config.json, см. postgres.py)
+    backend=create_backend(config.get("database"))
+)
+db = AsyncDatabase(
+    database,
+    # Объединение записей в общие транзакции включается в config.json
+    group_commit=GROUP_COMMIT_METHODS if config.get("db_group_commit", False) else (),
+    batch_size=config.get("db_group_commit_size", 100),
+    batch_delay=config.get("db_group_commit_delay", 0.005)
+)
+
+# Планировщик напоминаний
+scheduler = ReminderScheduler(
+    db,
+    partitions=SCHEDULER_PARTITIONS,
+    horizon=config.get("scheduler_horizon", 3600),
+    lease_ttl=config.get("scheduler_lease_ttl", 30)
+)
+database.scheduler = scheduler
+
+# Отправитель сообщений из очереди outbox
+sender = OutboxSender(db, batch=config.get("outbox_batch", 100))
+
+# Перенос обработанных напоминаний в архив
+archiver = ReminderArchiver(
+    db,
+    interval=config.get("archive_interval", 3600),
+    archive_after=config.get("archive_after", 86400),
+    compress=config.get("archive_compress", False)
+)
+
+# Пользователи, уже сохранённые в таблице users: ID -> (username, ID чата)
+known_users = LRUCache(maxsize=100000, ttl=86400)
 
 # Обработчики сообщений для бота
 
+async def track_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сохранение username и личного чата пользователя (для отправки приглашений)."""
+    user = update.effective_user
+    chat = update.effective_chat
+    if not user or not chat or chat.type != 'private':
+        return
+    # Пишем в базу только новых пользователей и изменившиеся данные
+    if known_users.get(user.id) == (user.username, chat.id):
+        return
+    if await db.save_user(user.id, user.username, chat.id):
+        known_users.set(user.id, (user.username, chat.id))
+
+async def send_invites(bot, team_name, invites):
+    """Отправка приглашений известным боту пользователям сразу после создания."""
+    chats = await db.get_user_chats([invite['invited_username'] for invite in invites])
+    for invite in invites:
+        chat_id = chats.get(invite['invited_username'])
+        if chat_id is None:
+            # Пользователь ещё не писал боту - увидит приглашение в меню
+            continue
+        keyboard = [[
+            InlineKeyboardButton("✅ Принять", callback_data=f"accept_invite_{invite['id']}"),
+            InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_invite_{invite['id']}")
+        ]]
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=f"Вас пригласили в команду '{team_name}'.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось отправить приглашение #{invite['id']} пользователю {invite['invited_username']}: {e}")
+
+def format_reminder(number, reminder):
+    """Строка списка напоминаний: время, команда, повторение и начало текста."""
+    reminder_time = datetime.fromisoformat(reminder['reminder_time']).strftime('%d.%m.%Y %H:%M')
+    team_info = f" (Команда: {reminder['team_name']})" if reminder['team_name'] else ""
+    repeat_info = f" 🔁 {describe_rule(reminder['recurrence'])}" if reminder['recurrence'] else ""
+    text = reminder['reminder_text']
+    if len(text) > PREVIEW_LENGTH:
+        text = text[:PREVIEW_LENGTH] + "…"
+    return f"{number}. {reminder_time}{team_info}{repeat_info}\n{text}\n\n"
+
+async def create_reminders_page(user_id, after_id=0, before_id=None, title="Ваши напоминания:"):
+    """Текст и клавиатура страницы списка напоминаний с кнопками удаления и перехода.
+    
+    Начало страницы запоминается, чтобы после удаления напоминания показать её же.
+    
+    Returns:
+        tuple: (текст, клавиатура) или None, если напоминаний нет
+    """
+    reminders, has_previous, has_next = await db.get_reminders_page(user_id, after_id, before_id, PAGE_SIZE)
+    if not reminders and before_id is None and after_id:
+        # Страница опустела (удалены её напоминания) - показываем предыдущую
+        reminders, has_previous, has_next = await db.get_reminders_page(user_id, before_id=after_id + 1, limit=PAGE_SIZE)
+    elif not reminders and before_id is not None:
+        reminders, has_previous, has_next = await db.get_reminders_page(user_id, limit=PAGE_SIZE)
+    if not reminders:
+        return None
+    user_data_dict.setdefault(user_id, {})['reminders_after'] = reminders[0]['id'] - 1
+    
+    reminder_text = f"{title}\n\n"
+    for i, reminder in enumerate(reminders, 1):
+        reminder_text += format_reminder(i, reminder)
+    
+    # Кнопки удаления напоминаний страницы и перехода между страницами
+    keyboard = []
+    for i, reminder in enumerate(reminders, 1):
+        keyboard.append([InlineKeyboardButton(f"Удалить напоминание #{i}", callback_data=f"delete_reminder_{reminder['id']}")])
+    navigation = []
+    if has_previous:
+        navigation.append(InlineKeyboardButton("◀️ Предыдущие", callback_data=f"reminders_before_{reminders[0]['id']}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Следующие ▶️", callback_data=f"reminders_after_{reminders[-1]['id']}"))
+    if navigation:
+        keyboard.append(navigation)
+    
+    keyboard.append([InlineKeyboardButton("Назад", callback_data='back_to_reminder')])
+    return reminder_text, InlineKeyboardMarkup(keyboard)
+
+async def create_teams_page(user_id, after_id=0, before_id=None):
+    """Текст и клавиатура страницы списка команд пользователя.
+    
+    Returns:
+        tuple: (текст, клавиатура) или None, если команд нет
+    """
+    teams, has_previous, has_next = await db.get_teams_page(user_id, after_id, before_id, PAGE_SIZE)
+    if not teams and (after_id or before_id is not None):
+        # Команды страницы удалены - показываем первую
+        teams, has_previous, has_next = await db.get_teams_page(user_id, limit=PAGE_SIZE)
+    if not teams:
+        return None
+    
+    team_text = "Ваши команды:\n\n"
+    for i, team in enumerate(teams, 1):
+        member_count = len(team['members'])
+        team_text += f"{i}. {team['name']} - {member_count} участников\n"
+    
+    keyboard = []
+    navigation = []
+    if has_previous:
+        navigation.append(InlineKeyboardButton("◀️ Предыдущие", callback_data=f"teams_before_{teams[0]['id']}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Следующие ▶️", callback_data=f"teams_after_{teams[-1]['id']}"))
+    if navigation:
+        keyboard.append(navigation)
+    
+    keyboard.append([InlineKeyboardButton("Назад", callback_data='back_to_team')])
+    return team_text, InlineKeyboardMarkup(keyboard)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отображение главного меню с кнопками."""
     user = update.effective_user
@@ -508,8 +2111,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     
     # Проверяем наличие приглашений для пользователя
     if username:
-        invites = db.get_pending_invites(username)
-        invites_count = len(invites)
+        invites_count = await db.count_pending_invites(username)
         invite_button_text = f"Приглашения ({invites_count})" if invites_count > 0 else "Приглашения"
     else:
         invite_button_text = "Приглашения"
@@ -531,9 +2133,9 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     user_id = update.effective_user.id
     username = update.effective_user.username
     
-    # Проверяем наличие приглашений для пользователя
-    if username:
-        pending_invites = db.get_pending_invites(username)
+    # Проверяем наличие приглашений для пользователя (счётчик кэшируется, список читаем только при наличии)
+    if username and await db.count_pending_invites(username):
+        pending_invites = await db.get_pending_invites(username)
         
         if pending_invites:
             # Если есть приглашения, показываем их
@@ -570,6 +2172,7 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         keyboard = [
             [InlineKeyboardButton("Создать напоминание", callback_data='create_reminder'),
              InlineKeyboardButton("Просмотреть напоминания", callback_data='view_reminders')],
+            [InlineKeyboardButton("Найти напоминание", callback_data='search_reminders')],
             [InlineKeyboardButton("Назад", callback_data='back_to_main')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -593,31 +2196,31 @@ async def team_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         await query.edit_message_text("Введите название команды:")
         return TEAM_NAME
     
-    elif query.data == 'view_teams':
+    elif query.data == 'view_teams' or query.data.startswith(('teams_after_', 'teams_before_')):
         user_id = update.effective_user.id
-        teams = db.get_teams(user_id)
+        # Страница после/перед командой из кнопки перехода (по умолчанию - первая)
+        after_id, before_id = 0, None
+        if query.data.startswith('teams_after_'):
+            after_id = int(query.data.split('_')[-1])
+        elif query.data.startswith('teams_before_'):
+            before_id = int(query.data.split('_')[-1])
+        page = await create_teams_page(user_id, after_id, before_id)
         
-        if not teams:
+        if not page:
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_team')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("У вас нет команд. Создайте новую команду.", reply_markup=reply_markup)
             return TEAM
         
         # Отображение команд
-        team_text = "Ваши команды:\n\n"
-        for i, team in enumerate(teams, 1):
-            member_count = len(team['members'])
-            team_text += f"{i}. {team['name']} - {member_count} участников\n"
-        
-        keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_team')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        team_text, reply_markup = page
         await query.edit_message_text(team_text, reply_markup=reply_markup)
         return TEAM_VIEW
 
     elif query.data == 'delete_team':
         # Проверяем, состоит ли пользователь в каких-либо командах
         user_id = update.effective_user.id
-        teams = db.get_teams(user_id)
+        teams = await db.get_teams(user_id)
         
         if not teams:
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_team')]]
@@ -649,7 +2252,7 @@ async def team_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         # Удаление команды
         user_id = update.effective_user.id
         team_id = int(query.data.split('_')[-1])
-        team = db.get_team_by_id(team_id)
+        team = await db.get_team_by_id(team_id)
         
         if not team:
             await query.edit_message_text("Команда не найдена.")
@@ -666,7 +2269,7 @@ async def team_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             return TEAM
             
         # Удаляем команду
-        success = db.delete_team(team_id)
+        success = await db.delete_team(team_id)
         
         if success:
             keyboard = [
@@ -735,42 +2338,28 @@ async def team_members_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         
         # Сначала создаем команду только с создателем
         initial_members = [user_id]  # Только создатель в качестве начального участника
-        success = db.add_team(team_name, initial_members, user_id)
+        team_id = await db.add_team(team_name, initial_members, user_id)
         
-        if success:
-            # Получаем ID созданной команды
-            teams = db.get_teams(user_id)
-            team_id = None
-            for team in teams:
-                if team['name'] == team_name:
-                    team_id = team['id']
-                    break
-            
-            if team_id:
-                # Отправка приглашений всем указанным пользователям
-                invited_usernames = user_data_dict[user_id].get('invited_usernames', [])
-                for username in invited_usernames:
-                    invite_id = db.add_team_invite(team_id, team_name, username, user_id)
-                    if invite_id:
-                        logger.info(f"Создано приглашение #{invite_id} для пользователя {username} в команду {team_name}")
-                
-                keyboard = [
-                    [InlineKeyboardButton("В главное меню", callback_data='back_to_main')],
-                    [InlineKeyboardButton("К командам", callback_data='back_to_team')]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                invite_message = ""
-                if invited_usernames:
-                    invite_message = f"\n\nПриглашения отправлены пользователям: {', '.join(['@' + username for username in invited_usernames])}"
-                
-                await update.message.reply_text(
-                    f"Команда '{team_name}' успешно создана!{invite_message}",
-                    reply_markup=reply_markup
-                )
-            else:
-                await update.message.reply_text("Произошла ошибка при создании команды. Не удалось получить ID команды.")
-                return ConversationHandler.END
+        if team_id:
+            # Отправка приглашений всем указанным пользователям
+            invited_usernames = user_data_dict[user_id].get('invited_usernames', [])
+            invites = await db.add_team_invites(team_id, team_name, invited_usernames, user_id)
+            await send_invites(context.bot, team_name, invites)
+            
+            keyboard = [
+                [InlineKeyboardButton("В главное меню", callback_data='back_to_main')],
+                [InlineKeyboardButton("К командам", callback_data='back_to_team')]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            invite_message = ""
+            if invited_usernames:
+                invite_message = f"\n\nПриглашения отправлены пользователям: {', '.join(['@' + username for username in invited_usernames])}"
+            
+            await update.message.reply_text(
+                f"Команда '{team_name}' успешно создана!{invite_message}",
+                reply_markup=reply_markup
+            )
         else:
             await update.message.reply_text("Произошла ошибка при создании команды. Попробуйте еще раз.")
             return ConversationHandler.END
@@ -812,40 +2401,30 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     
     elif query.data == 'view_reminders':
         user_id = update.effective_user.id
-        reminders = db.get_reminders(user_id=user_id)
+        # Первая страница напоминаний
+        page = await create_reminders_page(user_id)
         
-        if not reminders:
+        if not page:
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("У вас нет напоминаний.", reply_markup=reply_markup)
             return REMINDER
         
-        # Сохраняем напоминания в user_data_dict для последующего использования
-        if user_id not in user_data_dict:
-            user_data_dict[user_id] = {}
-        user_data_dict[user_id]['reminders'] = reminders
-        
         # Отображение напоминаний
-        reminder_text = "Ваши напоминания:\n\n"
-        for i, reminder in enumerate(reminders, 1):
-            reminder_time = datetime.fromisoformat(reminder['reminder_time']).strftime('%d.%m.%Y %H:%M')
-            team_info = f" (Команда: {reminder['team_name']})" if reminder['team_name'] else ""
-            reminder_text += f"{i}. {reminder_time}{team_info}\n{reminder['reminder_text']}\n\n"
-        
-        # Добавляем кнопки для удаления напоминаний
-        keyboard = []
-        for i, reminder in enumerate(reminders, 1):
-            keyboard.append([InlineKeyboardButton(f"Удалить напоминание #{i}", callback_data=f"delete_reminder_{reminder['id']}")])
-        
-        keyboard.append([InlineKeyboardButton("Назад", callback_data='back_to_reminder')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reminder_text, reply_markup = page
         await query.edit_message_text(reminder_text, reply_markup=reply_markup)
         return REMINDER_VIEW
     
+    elif query.data == 'search_reminders':
+        keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.edit_message_text("Введите слова для поиска по тексту напоминаний:", reply_markup=reply_markup)
+        return REMINDER_SEARCH
+    
     elif query.data == 'leave_team_menu':
         # Проверяем, состоит ли пользователь в каких-либо командах
         user_id = update.effective_user.id
-        teams = db.get_teams(user_id)
+        teams = await db.get_teams(user_id)
         
         if not teams:
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
@@ -877,7 +2456,7 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     elif query.data.startswith('leave_member_'):
         # Выход обычного участника из команды
         team_id = int(query.data.split('_')[-1])
-        team = db.get_team_by_id(team_id)
+        team = await db.get_team_by_id(team_id)
         
         if not team:
             await query.edit_message_text("Команда не найдена.")
@@ -885,13 +2464,11 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             
         user_id = update.effective_user.id
         # Удаляем пользователя из команды
-        success = db.remove_user_from_team(team_id, user_id)
+        success = await db.remove_user_from_team(team_id, user_id)
         
         if success:
             # Удаляем напоминания этой команды
-            reminders = db.get_reminders(user_id, team_name=team['name'])
-            for reminder in reminders:
-                db.delete_reminder(reminder['id'])
+            await db.delete_reminders(user_id, team_id=team_id)
                 
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -908,7 +2485,7 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     elif query.data.startswith('leave_creator_'):
         # Создатель выходит и удаляет команду
         team_id = int(query.data.split('_')[-1])
-        team = db.get_team_by_id(team_id)
+        team = await db.get_team_by_id(team_id)
         
         if not team:
             await query.edit_message_text("Команда не найдена.")
@@ -926,7 +2503,7 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             return REMINDER
             
         # Удаляем команду
-        success = db.delete_team(team_id)
+        success = await db.delete_team(team_id)
         
         if success:
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
@@ -945,6 +2522,7 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         keyboard = [
             [InlineKeyboardButton("Создать напоминание", callback_data='create_reminder'),
              InlineKeyboardButton("Просмотреть напоминания", callback_data='view_reminders')],
+            [InlineKeyboardButton("Найти напоминание", callback_data='search_reminders')],
             [InlineKeyboardButton("Выйти из команды", callback_data='leave_team_menu')],
             [InlineKeyboardButton("Назад", callback_data='back_to_main')]
         ]
@@ -957,6 +2535,36 @@ async def reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     
     return REMINDER
 
+async def reminder_search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработка ввода запроса для поиска напоминаний."""
+    user_id = update.effective_user.id
+    # Не больше страницы списка: сообщение должно уместиться в лимит Telegram
+    reminders = await db.search_reminders(update.message.text, user_id=user_id, limit=PAGE_SIZE)
+    
+    if not reminders:
+        keyboard = [
+            [InlineKeyboardButton("Искать ещё", callback_data='search_reminders')],
+            [InlineKeyboardButton("Назад", callback_data='back_to_reminder')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await update.message.reply_text("Ничего не найдено.", reply_markup=reply_markup)
+        return REMINDER
+    
+    # Отображение найденных напоминаний (самые подходящие первыми)
+    reminder_text = "Найденные напоминания:\n\n"
+    for i, reminder in enumerate(reminders, 1):
+        reminder_text += format_reminder(i, reminder)
+    
+    # Добавляем кнопки для удаления найденных напоминаний
+    keyboard = []
+    for i, reminder in enumerate(reminders, 1):
+        keyboard.append([InlineKeyboardButton(f"Удалить напоминание #{i}", callback_data=f"delete_reminder_{reminder['id']}")])
+    
+    keyboard.append([InlineKeyboardButton("Назад", callback_data='back_to_reminder')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(reminder_text, reply_markup=reply_markup)
+    return REMINDER_VIEW
+
 async def reminder_create_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка выбора типа напоминания."""
     query = update.callback_query
@@ -973,7 +2581,7 @@ async def reminder_create_handler(update: Update, context: ContextTypes.DEFAULT_
     
     elif query.data == 'team_reminder':
         # Проверка наличия команд у пользователя
-        teams = db.get_teams(user_id)
+        teams = await db.get_teams(user_id)
         if not teams:
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder_create')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -986,7 +2594,7 @@ async def reminder_create_handler(update: Update, context: ContextTypes.DEFAULT_
         user_data_dict[user_id]['reminder_type'] = 'team'
         keyboard = []
         for team in teams:
-            keyboard.append([InlineKeyboardButton(team['name'], callback_data=f"team_{team['name']}")])
+            keyboard.append([InlineKeyboardButton(team['name'], callback_data=f"team_{team['id']}")])
         keyboard.append([InlineKeyboardButton("Выйти из команды", callback_data='leave_team_from_reminder')])
         keyboard.append([InlineKeyboardButton("Назад", callback_data='back_to_reminder_create')])
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1005,8 +2613,15 @@ async def reminder_team_handler(update: Update, context: ContextTypes.DEFAULT_TY
     user_id = update.effective_user.id
     
     if query.data.startswith('team_'):
-        team_name = query.data[5:]  # Убираем префикс 'team_'
-        user_data_dict[user_id]['team_name'] = team_name
+        team_id = int(query.data[5:])  # Убираем префикс 'team_'
+        team = await db.get_team_by_id(team_id)
+        
+        if not team or user_id not in team['members']:
+            await query.edit_message_text("Команда не найдена.")
+            return ConversationHandler.END
+        
+        user_data_dict[user_id]['team_id'] = team_id
+        user_data_dict[user_id]['team_name'] = team['name']
         
         await query.edit_message_text("Введите текст напоминания:")
         return REMINDER_TEXT
@@ -1028,7 +2643,7 @@ async def reminder_team_handler(update: Update, context: ContextTypes.DEFAULT_TY
     elif query.data.startswith('confirm_leave_reminder_'):
         # Подтверждение выхода из команды
         team_id = int(query.data.split('_')[-1])
-        team = db.get_team_by_id(team_id)
+        team = await db.get_team_by_id(team_id)
         
         if not team:
             await query.edit_message_text("Команда не найдена.")
@@ -1045,13 +2660,11 @@ async def reminder_team_handler(update: Update, context: ContextTypes.DEFAULT_TY
             return REMINDER_TEAM
             
         # Удаляем пользователя из команды
-        success = db.remove_user_from_team(team_id, user_id)
+        success = await db.remove_user_from_team(team_id, user_id)
         
         if success:
             # Удаляем напоминания этой команды
-            reminders = db.get_reminders(user_id, team_name=team['name'])
-            for reminder in reminders:
-                db.delete_reminder(reminder['id'])
+            await db.delete_reminders(user_id, team_id=team_id)
                 
             # Возвращаемся к выбору команды для напоминания
             keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder_create')]]
@@ -1198,6 +2811,16 @@ async def calendar_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         
     return REMINDER_DATE
 
+def create_repeat_keyboard():
+    """Создание клавиатуры выбора повторения напоминания."""
+    return [
+        [InlineKeyboardButton("Один раз", callback_data="repeat_once")],
+        [InlineKeyboardButton("Каждый день", callback_data="repeat_daily"),
+         InlineKeyboardButton("Каждую неделю", callback_data="repeat_weekly")],
+        [InlineKeyboardButton("Каждый месяц", callback_data="repeat_monthly")],
+        [InlineKeyboardButton("Своё правило (cron)", callback_data="repeat_cron")]
+    ]
+
 async def reminder_time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка выбора времени напоминания."""
     user_id = update.effective_user.id
@@ -1218,63 +2841,30 @@ async def reminder_time_handler(update: Update, context: ContextTypes.DEFAULT_TY
             )
             return REMINDER_DATE
         
-        if query.data.startswith("time_"):
-            time_value = query.data[5:]  # Удаляем "time_" из начала
-            
-            if time_value == "custom":
-                await query.edit_message_text(
-                    "Введите время в формате ЧЧ:ММ (например: 14:30):"
-                )
-                return REMINDER_TIME
-            
-            # Используем выбранное время и дату из кнопок
-            selected_date = user_data_dict[user_id]['reminder_date']
-            date_time_str = f"{selected_date} {time_value}"
-            
-            try:
-                reminder_time = datetime.strptime(date_time_str, '%d.%m.%Y %H:%M')
-                
-                # Сохранение в базу данных
-                reminder_type = user_data_dict[user_id]['reminder_type']
-                reminder_text = user_data_dict[user_id]['reminder_text']
-                
-                if reminder_type == 'personal':
-                    success = db.add_reminder(
-                        user_id=user_id,
-                        reminder_time=reminder_time.isoformat(),
-                        reminder_text=reminder_text
-                    )
-                else:  # Напоминание для команды
-                    team_name = user_data_dict[user_id]['team_name']
-                    success = db.add_reminder(
-                        user_id=user_id,
-                        reminder_time=reminder_time.isoformat(),
-                        reminder_text=reminder_text,
-                        team_name=team_name
-                    )
-                
-                if success:
-                    reminder_type_text = "личное" if reminder_type == 'personal' else f"для команды '{user_data_dict[user_id]['team_name']}'"
-                    keyboard = [
-                        [InlineKeyboardButton("В главное меню", callback_data='back_to_main')],
-                        [InlineKeyboardButton("К напоминаниям", callback_data='back_to_reminder')]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    await query.edit_message_text(
-                        f"Напоминание {reminder_type_text} успешно создано на {date_time_str}!",
-                        reply_markup=reply_markup
-                    )
-                else:
-                    await query.edit_message_text("Произошла ошибка при создании напоминания. Попробуйте еще раз.")
-                    return ConversationHandler.END
-                
-            except ValueError:
-                await query.edit_message_text(
-                    "Неверный формат времени. Выберите время снова."
-                )
-                return REMINDER_TIME
-            
-            return REMINDER
+        if not query.data.startswith("time_"):
+            return REMINDER_TIME
+        
+        time_value = query.data[5:]  # Удаляем "time_" из начала
+        
+        if time_value == "custom":
+            await query.edit_message_text(
+                "Введите время в формате ЧЧ:ММ (например: 14:30):"
+            )
+            return REMINDER_TIME
+        
+        # Используем выбранное время и дату из кнопок
+        selected_date = user_data_dict[user_id]['reminder_date']
+        date_time_str = f"{selected_date} {time_value}"
+        
+        try:
+            reminder_time = datetime.strptime(date_time_str, '%d.%m.%Y %H:%M')
+        except ValueError:
+            await query.edit_message_text(
+                "Неверный формат времени. Выберите время снова."
+            )
+            return REMINDER_TIME
+        
+        reply = query.edit_message_text
     else:
         # Это обычное текстовое сообщение с произвольным временем
         time_text = update.message.text
@@ -1282,56 +2872,101 @@ async def reminder_time_handler(update: Update, context: ContextTypes.DEFAULT_TY
         try:
             # Парсим только время
             time_obj = datetime.strptime(time_text, '%H:%M').time()
-            
-            # Объединяем с выбранной датой
-            selected_date = user_data_dict[user_id]['reminder_date']
-            date_obj = datetime.strptime(selected_date, '%d.%m.%Y').date()
-            
-            # Создаем полную дату с временем
-            reminder_time = datetime.combine(date_obj, time_obj)
-            date_time_str = reminder_time.strftime('%d.%m.%Y %H:%M')
-            
-            # Сохранение в базу данных
-            reminder_type = user_data_dict[user_id]['reminder_type']
-            reminder_text = user_data_dict[user_id]['reminder_text']
-            
-            if reminder_type == 'personal':
-                success = db.add_reminder(
-                    user_id=user_id,
-                    reminder_time=reminder_time.isoformat(),
-                    reminder_text=reminder_text
-                )
-            else:  # Напоминание для команды
-                team_name = user_data_dict[user_id]['team_name']
-                success = db.add_reminder(
-                    user_id=user_id,
-                    reminder_time=reminder_time.isoformat(),
-                    reminder_text=reminder_text,
-                    team_name=team_name
-                )
-            
-            if success:
-                reminder_type_text = "личное" if reminder_type == 'personal' else f"для команды '{user_data_dict[user_id]['team_name']}'"
-                keyboard = [
-                    [InlineKeyboardButton("В главное меню", callback_data='back_to_main')],
-                    [InlineKeyboardButton("К напоминаниям", callback_data='back_to_reminder')]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await update.message.reply_text(
-                    f"Напоминание {reminder_type_text} успешно создано на {date_time_str}!",
-                    reply_markup=reply_markup
-                )
-            else:
-                await update.message.reply_text("Произошла ошибка при создании напоминания. Попробуйте еще раз.")
-                return ConversationHandler.END
-        
         except ValueError:
             await update.message.reply_text(
                 "Неверный формат времени. Пожалуйста, используйте формат ЧЧ:ММ (например: 14:30)."
             )
             return REMINDER_TIME
         
-        return REMINDER
+        # Объединяем с выбранной датой
+        selected_date = user_data_dict[user_id]['reminder_date']
+        date_obj = datetime.strptime(selected_date, '%d.%m.%Y').date()
+        
+        # Создаем полную дату с временем
+        reminder_time = datetime.combine(date_obj, time_obj)
+        reply = update.message.reply_text
+    
+    # Сохраняем время и переходим к выбору повторения
+    user_data_dict[user_id]['reminder_time'] = reminder_time.isoformat()
+    reply_markup = InlineKeyboardMarkup(create_repeat_keyboard())
+    await reply(
+        f"Напоминание на {reminder_time.strftime('%d.%m.%Y %H:%M')}.\nКак часто его повторять?",
+        reply_markup=reply_markup
+    )
+    return REMINDER_REPEAT
+
+async def reminder_repeat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработка выбора повторения и сохранение напоминания."""
+    user_id = update.effective_user.id
+    reminder_time = datetime.fromisoformat(user_data_dict[user_id]['reminder_time'])
+    
+    if update.callback_query:
+        query = update.callback_query
+        await query.answer()
+        
+        if query.data == "repeat_cron":
+            await query.edit_message_text(
+                "Введите правило в формате cron: минута час день месяц день_недели\n"
+                "Например: 0 9 * * 1-5 - по будням в 9:00.\n"
+                "Первое напоминание придёт в ближайшее подходящее время начиная с выбранной даты."
+            )
+            return REMINDER_REPEAT
+        
+        repeat_rules = {
+            "repeat_once": None,
+            "repeat_daily": "daily",
+            "repeat_weekly": "weekly",
+            "repeat_monthly": f"monthly:{reminder_time.day}"
+        }
+        if query.data not in repeat_rules:
+            return REMINDER_REPEAT
+        recurrence = repeat_rules[query.data]
+        reply = query.edit_message_text
+    else:
+        # Правило cron, введённое текстом
+        recurrence = f"cron:{update.message.text.strip()}"
+        try:
+            validate_rule(recurrence)
+        except ValueError:
+            await update.message.reply_text(
+                "Неверное правило. Используйте 5 полей через пробел, например: 0 9 * * 1-5"
+            )
+            return REMINDER_REPEAT
+        # Первое срабатывание - ближайшее подходящее под правило, не раньше выбранного времени
+        start_from = reminder_time - timedelta(minutes=1)
+        reminder_time = next_occurrence(recurrence, start_from, now=start_from)
+        reply = update.message.reply_text
+    
+    # Сохранение в базу данных
+    reminder_type = user_data_dict[user_id]['reminder_type']
+    reminder_text = user_data_dict[user_id]['reminder_text']
+    team_id = user_data_dict[user_id]['team_id'] if reminder_type != 'personal' else None
+    team_name = user_data_dict[user_id]['team_name'] if reminder_type != 'personal' else None
+    success = await db.add_reminder(
+        user_id=user_id,
+        reminder_time=reminder_time.isoformat(),
+        reminder_text=reminder_text,
+        team_id=team_id,
+        recurrence=recurrence
+    )
+    
+    if success:
+        reminder_type_text = "личное" if reminder_type == 'personal' else f"для команды '{team_name}'"
+        keyboard = [
+            [InlineKeyboardButton("В главное меню", callback_data='back_to_main')],
+            [InlineKeyboardButton("К напоминаниям", callback_data='back_to_reminder')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await reply(
+            f"Напоминание {reminder_type_text} успешно создано на {reminder_time.strftime('%d.%m.%Y %H:%M')} "
+            f"({describe_rule(recurrence)})!",
+            reply_markup=reply_markup
+        )
+    else:
+        await reply("Произошла ошибка при создании напоминания. Попробуйте еще раз.")
+        return ConversationHandler.END
+    
+    return REMINDER
 
 async def delete_reminder_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка удаления напоминания."""
@@ -1343,50 +2978,54 @@ async def delete_reminder_handler(update: Update, context: ContextTypes.DEFAULT_
         user_id = update.effective_user.id
         
         # Удаление напоминания
-        success = db.delete_reminder(reminder_id)
+        success = await db.delete_reminder(reminder_id)
         
         if success:
             logger.info(f"Напоминание {reminder_id} успешно удалено пользователем {user_id}")
             
-            # Получаем обновленный список напоминаний
-            reminders = db.get_reminders(user_id=user_id)
+            # Показываем ту же страницу списка без удалённого напоминания
+            after_id = user_data_dict.get(user_id, {}).get('reminders_after', 0)
+            page = await create_reminders_page(user_id, after_id, title="Напоминание удалено!\n\nВаши напоминания:")
             
-            if not reminders:
+            if not page:
                 keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 await query.edit_message_text("Напоминание удалено. У вас больше нет напоминаний.", reply_markup=reply_markup)
                 return REMINDER
             
-            # Обновляем список напоминаний в user_data_dict
-            if user_id not in user_data_dict:
-                user_data_dict[user_id] = {}
-            user_data_dict[user_id]['reminders'] = reminders
-            
             # Отображение обновленных напоминаний
-            reminder_text = "Напоминание удалено!\n\nВаши напоминания:\n\n"
-            for i, reminder in enumerate(reminders, 1):
-                reminder_time = datetime.fromisoformat(reminder['reminder_time']).strftime('%d.%m.%Y %H:%M')
-                team_info = f" (Команда: {reminder['team_name']})" if reminder['team_name'] else ""
-                reminder_text += f"{i}. {reminder_time}{team_info}\n{reminder['reminder_text']}\n\n"
-            
-            # Добавляем кнопки для удаления напоминаний
-            keyboard = []
-            for i, reminder in enumerate(reminders, 1):
-                keyboard.append([InlineKeyboardButton(f"Удалить напоминание #{i}", callback_data=f"delete_reminder_{reminder['id']}")])
-            
-            keyboard.append([InlineKeyboardButton("Назад", callback_data='back_to_reminder')])
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reminder_text, reply_markup = page
             await query.edit_message_text(reminder_text, reply_markup=reply_markup)
             return REMINDER_VIEW
         else:
             await query.edit_message_text("Произошла ошибка при удалении напоминания.")
             return ConversationHandler.END
+    
+    if query.data.startswith(('reminders_after_', 'reminders_before_')):
+        # Переход на следующую или предыдущую страницу списка
+        user_id = update.effective_user.id
+        reminder_id = int(query.data.split('_')[-1])
+        if query.data.startswith('reminders_after_'):
+            page = await create_reminders_page(user_id, after_id=reminder_id)
+        else:
+            page = await create_reminders_page(user_id, before_id=reminder_id)
+        
+        if not page:
+            keyboard = [[InlineKeyboardButton("Назад", callback_data='back_to_reminder')]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await query.edit_message_text("У вас нет напоминаний.", reply_markup=reply_markup)
+            return REMINDER
+        
+        reminder_text, reply_markup = page
+        await query.edit_message_text(reminder_text, reply_markup=reply_markup)
+        return REMINDER_VIEW
     # Если это кнопка "Назад"
     if query.data == 'back_to_reminder':
         # Возврат в меню напоминаний
         keyboard = [
             [InlineKeyboardButton("Создать напоминание", callback_data='create_reminder'),
              InlineKeyboardButton("Просмотреть напоминания", callback_data='view_reminders')],
+            [InlineKeyboardButton("Найти напоминание", callback_data='search_reminders')],
             [InlineKeyboardButton("Выйти из команды", callback_data='leave_team_menu')],
             [InlineKeyboardButton("Назад", callback_data='back_to_main')]
         ]
@@ -1428,6 +3067,7 @@ async def back_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         keyboard = [
             [InlineKeyboardButton("Создать напоминание", callback_data='create_reminder'),
              InlineKeyboardButton("Просмотреть напоминания", callback_data='view_reminders')],
+            [InlineKeyboardButton("Найти напоминание", callback_data='search_reminders')],
             [InlineKeyboardButton("Выйти из команды", callback_data='leave_team_menu')],
             [InlineKeyboardButton("Назад", callback_data='back_to_main')]
         ]
@@ -1459,7 +3099,7 @@ async def invite_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if query.data.startswith('accept_invite_'):
         # Принятие приглашения
         invite_id = int(query.data.split('_')[-1])
-        invite = db.get_invite_by_id(invite_id)
+        invite = await db.get_invite_by_id(invite_id)
         
         if not invite:
             await query.edit_message_text("Приглашение не найдено или уже обработано.")
@@ -1471,14 +3111,14 @@ async def invite_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return ConversationHandler.END
             
         # Обновляем статус приглашения
-        db.update_invite_status(invite_id, 'accepted')
+        await db.update_invite_status(invite_id, 'accepted')
         
         # Добавляем пользователя в команду
         team_id = invite['team_id']
-        success = db.add_user_to_team(team_id, user_id)
+        success = await db.add_user_to_team(team_id, user_id)
         
         if success:
-            team = db.get_team_by_id(team_id)
+            team = await db.get_team_by_id(team_id)
             keyboard = [[InlineKeyboardButton("В главное меню", callback_data='back_to_main')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
@@ -1494,7 +3134,7 @@ async def invite_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif query.data.startswith('reject_invite_'):
         # Отклонение приглашения
         invite_id = int(query.data.split('_')[-1])
-        invite = db.get_invite_by_id(invite_id)
+        invite = await db.get_invite_by_id(invite_id)
         
         if not invite:
             await query.edit_message_text("Приглашение не найдено или уже обработано.")
@@ -1506,7 +3146,7 @@ async def invite_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return ConversationHandler.END
             
         # Обновляем статус приглашения
-        db.update_invite_status(invite_id, 'rejected')
+        await db.update_invite_status(invite_id, 'rejected')
         
         keyboard = [[InlineKeyboardButton("В главное меню", callback_data='back_to_main')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1574,63 +3214,113 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     """Обработка ошибок."""
     logger.error(f"Ошибка: {context.error}")
 
-async def check_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Функция для проверки и отправки напоминаний."""
-    logger.info("Проверка напоминаний...")
-    
-    # Получаем текущее время в ISO формате
-    now = datetime.now()
-    current_time = now.replace(second=0, microsecond=0).isoformat()
-    
-    # Получаем все напоминания
-    reminders = db.get_reminders()
-    
-    # Фильтруем только те, время которых пришло или чуть-чуть не дошло
-    # (в течение последней минуты)
-    pending_reminders = []
-    for reminder in reminders:
-        reminder_time = datetime.fromisoformat(reminder['reminder_time'])
-        if now >= reminder_time and (now - reminder_time).total_seconds() < 60:
-            pending_reminders.append(reminder)
-    
-    logger.info(f"Найдено {len(pending_reminders)} напоминаний, требующих отправки")
-    
-    # Отправляем напоминания
-    for reminder in pending_reminders:
-        user_id = reminder['user_id']
-        team_name = reminder['team_name']
-        reminder_text = reminder['reminder_text']
-        
-        if team_name:
-            # Это командное напоминание, отправим всем участникам команды
-            logger.info(f"Отправка командного напоминания для {team_name}")
-            teams = db.get_teams()
-            for team in teams:
-                if team['name'] == team_name:
-                    members = team['members']
-                    for member_id in members:
-                        try:
-                            await context.bot.send_message(
-                                chat_id=member_id,
-                                text=f"⏰ Напоминание для команды {team_name}:\n\n{reminder_text}"
-                            )
-                            logger.info(f"Напоминание отправлено участнику {member_id} команды {team_name}")
-                        except Exception as e:
-                            logger.error(f"Ошибка отправки напоминания пользователю {member_id}: {e}")
-        else:
-            # Это личное напоминание
-            logger.info(f"Отправка личного напоминания для пользователя {user_id}")
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"⏰ Напоминание:\n\n{reminder_text}"
-                )
-                logger.info(f"Напоминание отправлено пользователю {user_id}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки напоминания пользователю {user_id}: {e}")
-    
-    # Здесь можно добавить удаление отправленных напоминаний или 
-    # установку флага "отправлено" в базе данных
+def create_send_engine(bot):
+    """Создание движка отправки с лимитами из config.json."""
+    return SendEngine(
+        bot,
+        concurrency=config.get("send_concurrency", 20),
+        global_rate=config.get("send_global_rate", 25),
+        chat_rate=config.get("send_chat_rate", 1)
+    )
+
+def start_metrics_export():
+    """Запуск периодической выгрузки метрик, если в config.json указан metrics_file."""
+    path = config.get("metrics_file")
+    if not path:
+        return None
+    logger.info(f"Метрики выгружаются в {path}")
+    return asyncio.create_task(metrics.export_loop(path, config.get("metrics_interval", 15)))
+
+def start_checkpoints():
+    """Запуск периодического checkpoint журнала WAL."""
+    return asyncio.create_task(checkpoint_loop(db, config.get("checkpoint_interval", 300)))
+
+def start_backups():
+    """Запуск периодических снимков базы, если в config.json указан backup_dir."""
+    directory = config.get("backup_dir")
+    if not directory:
+        return None
+    if database.backend.name != 'sqlite':
+        logger.warning("Снимки базы делаются только для SQLite, для PostgreSQL используйте pg_dump")
+        return None
+    logger.info(f"Снимки базы сохраняются в {directory}")
+    return asyncio.create_task(backup_loop(
+        database.backend.db_name,
+        directory,
+        interval=config.get("backup_interval", 86400),
+        keep=config.get("backup_keep", 7)
+    ))
+
+async def post_init(application: Application) -> None:
+    """Запуск планировщика напоминаний и отправителя после инициализации приложения."""
+    application.bot_data['metrics_task'] = start_metrics_export()
+    application.bot_data['checkpoint_task'] = start_checkpoints()
+    application.bot_data['backup_task'] = start_backups()
+    
+    # Отправку можно целиком отдать отдельным процессам sender.py
+    if config.get("run_sender", True):
+        sender.start(create_send_engine(application.bot))
+    else:
+        logger.info("Отправитель в процессе бота отключён (run_sender = false)")
+    
+    # Планирование можно целиком отдать отдельным процессам worker.py
+    if not config.get("run_scheduler", True):
+        logger.info("Планировщик в процессе бота отключён (run_scheduler = false)")
+        return
+    await scheduler.start(on_enqueue=sender.notify)
+    archiver.start()
+    logger.info("📅 Планировщик напоминаний запущен")
+
+async def post_shutdown(application: Application) -> None:
+    """Остановка планировщика напоминаний и отправителя."""
+    for task_name in ('metrics_task', 'checkpoint_task', 'backup_task'):
+        task = application.bot_data.get(task_name)
+        if task:
+            task.cancel()
+    if config.get("run_scheduler", True):
+        await scheduler.stop()
+        await archiver.stop()
+    if config.get("run_sender", True):
+        await sender.stop()
+
+def create_conversation_handler():
+    """Обработчик диалогов бота (общий для run_bot и async_main)."""
+    return ConversationHandler(
+        entry_points=[
+            CommandHandler("start", start),
+            # Кнопки приглашений, отправленных пользователю сообщением
+            CallbackQueryHandler(invite_handler, pattern=r'^(accept|reject)_invite_\d+$')
+        ],
+        states={
+            MENU: [CallbackQueryHandler(menu_handler)],
+            TEAM: [CallbackQueryHandler(team_handler)],
+            TEAM_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, team_name_handler)],
+            TEAM_MEMBERS: [MessageHandler(filters.TEXT & ~filters.COMMAND, team_members_handler)],
+            TEAM_VIEW: [CallbackQueryHandler(team_handler)],
+            TEAM_LEAVE: [CallbackQueryHandler(leave_team_handler)],
+            INVITES: [CallbackQueryHandler(invite_handler)],
+            REMINDER: [CallbackQueryHandler(reminder_handler)],
+            REMINDER_CREATE: [CallbackQueryHandler(reminder_create_handler)],
+            REMINDER_TEAM: [CallbackQueryHandler(reminder_team_handler)],
+            REMINDER_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_text_handler)],
+            REMINDER_DATE: [CallbackQueryHandler(calendar_handler)],
+            REMINDER_TIME: [
+                CallbackQueryHandler(reminder_time_handler),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_time_handler)
+            ],
+            REMINDER_REPEAT: [
+                CallbackQueryHandler(reminder_repeat_handler),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_repeat_handler)
+            ],
+            REMINDER_VIEW: [CallbackQueryHandler(delete_reminder_handler)],
+            REMINDER_SEARCH: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_search_handler),
+                CallbackQueryHandler(back_handler)
+            ],
+        },
+        fallbacks=[CommandHandler("start", start)],
+        allow_reentry=True,
+    )
 
 def run_bot():
     """Функция для запуска бота в non-asyncio режиме."""
@@ -1664,42 +3354,16 @@ def run_bot():
         logger.error(f"Ошибка при подготовке к запуску бота: {e}")
         
     # Создание приложения
-    application = Application.builder().token(TOKEN).build()
+    application = Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     
     # Создание ConversationHandler
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
-        states={
-            MENU: [CallbackQueryHandler(menu_handler)],
-            TEAM: [CallbackQueryHandler(team_handler)],
-            TEAM_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, team_name_handler)],
-            TEAM_MEMBERS: [MessageHandler(filters.TEXT & ~filters.COMMAND, team_members_handler)],
-            TEAM_VIEW: [CallbackQueryHandler(team_handler)],
-            TEAM_LEAVE: [CallbackQueryHandler(leave_team_handler)],
-            INVITES: [CallbackQueryHandler(invite_handler)],
-            REMINDER: [CallbackQueryHandler(reminder_handler)],
-            REMINDER_CREATE: [CallbackQueryHandler(reminder_create_handler)],
-            REMINDER_TEAM: [CallbackQueryHandler(reminder_team_handler)],
-            REMINDER_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_text_handler)],
-            REMINDER_DATE: [CallbackQueryHandler(calendar_handler)],
-            REMINDER_TIME: [
-                CallbackQueryHandler(reminder_time_handler),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_time_handler)
-            ],
-            REMINDER_VIEW: [CallbackQueryHandler(delete_reminder_handler)],
-        },
-        fallbacks=[CommandHandler("start", start)],
-    )
+    conv_handler = create_conversation_handler()
     
     # Добавление обработчика диалогов в приложение
+    application.add_handler(TypeHandler(Update, track_user), group=-1)
     application.add_handler(conv_handler)
     application.add_error_handler(error_handler)
     
-    # Добавление планировщика задач для проверки напоминаний каждую минуту
-    job_queue = application.job_queue
-    job_queue.run_repeating(check_reminders, interval=60, first=10)
-    logger.info("📅 Планировщик напоминаний запущен")
-    
     # Запуск бота в non-blocking режиме
     logger.info("🔄 Запуск бота...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -1719,46 +3383,22 @@ def main():
 async def async_main():
     """Асинхронная функция запуска бота."""
     # Создание приложения
-    application = Application.builder().token(TOKEN).build()
+    application = Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     
     # Создание ConversationHandler
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
-        states={
-            MENU: [CallbackQueryHandler(menu_handler)],
-            TEAM: [CallbackQueryHandler(team_handler)],
-            TEAM_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, team_name_handler)],
-            TEAM_MEMBERS: [MessageHandler(filters.TEXT & ~filters.COMMAND, team_members_handler)],
-            TEAM_VIEW: [CallbackQueryHandler(delete_reminder_handler)],
-            TEAM_LEAVE: [CallbackQueryHandler(leave_team_handler)],
-            INVITES: [CallbackQueryHandler(invite_handler)],
-            REMINDER: [CallbackQueryHandler(reminder_handler)],
-            REMINDER_CREATE: [CallbackQueryHandler(reminder_create_handler)],
-            REMINDER_TEAM: [CallbackQueryHandler(reminder_team_handler)],
-            REMINDER_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_text_handler)],
-            REMINDER_DATE: [CallbackQueryHandler(calendar_handler)],
-            REMINDER_TIME: [
-                CallbackQueryHandler(reminder_time_handler),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, reminder_time_handler)
-            ],
-            REMINDER_VIEW: [CallbackQueryHandler(delete_reminder_handler)],
-        },
-        fallbacks=[CommandHandler("start", start)],
-    )
+    conv_handler = create_conversation_handler()
     
     # Добавление обработчика диалогов в приложение
+    application.add_handler(TypeHandler(Update, track_user), group=-1)
     application.add_handler(conv_handler)
     application.add_error_handler(error_handler)
     
-    # Добавление планировщика задач для проверки напоминаний каждую минуту
-    job_queue = application.job_queue
-    job_queue.run_repeating(check_reminders, interval=60, first=10)
-    logger.info("📅 Планировщик напоминаний запущен")
-    
     # Запуск бота в poll режиме
     logger.info("🚀 Запуск асинхронного бота...")
     await application.initialize()
     await application.start()
+    # post_init вызывается только из run_polling, поэтому запускаем планировщик и отправителя сами
+    await post_init(application)
     await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
     
     try:
@@ -1766,8 +3406,9 @@ async def async_main():
         await application.updater.stop()
         await application.stop()
     finally:
+        await post_shutdown(application)
         # Закрываем соединение с базой данных
-        db.close()
+        await db.close()
 
 if __name__ == "__main__":
     try:
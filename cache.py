@@ -0,0 +1,67 @@
+"""
+Кэш в памяти процесса с ограничением по размеру (LRU) и времени жизни записей.
+
+Используется базой данных для команд и списков команд пользователей: меню
+бота читают их постоянно, а меняются они редко. Записи удаляются из кэша
+при изменении данных, а время жизни ограничивает устаревание, если данные
+изменил другой процесс.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    # Признак отсутствия записи (None тоже может быть значением)
+    MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=300):
+        """Инициализация кэша.
+
+        Args:
+            maxsize (int): Максимальное количество записей
+            ttl (float): Время жизни записи в секундах
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # ключ -> (значение, когда устареет)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Значение из кэша или LRUCache.MISSING."""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return self.MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        """Запись значения в кэш (самая давно не использованная запись вытесняется)."""
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """Удаление записей из кэша."""
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Очистка кэша."""
+        self._entries.clear()
+
+    def stats(self):
+        """Текущее состояние кэша."""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
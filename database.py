@@ -1,7 +1,10 @@
+import json
 import sqlite3
 import logging
 from datetime import datetime
 
+import storage
+
 # Configure logging
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -19,29 +22,42 @@ class Database:
     def connect(self):
         """Establish a connection to the database."""
         try:
-            self.conn = sqlite3.connect(self.db_name)
+            self.conn = storage.connect(self.db_name, row_factory=None)
             return self.conn
         except sqlite3.Error as e:
             logger.error(f"Database connection error: {e}")
             return None
 
     def create_tables(self):
-        """Create the Teams and Reminders tables if they don't exist."""
+        """Create the Teams, Team members and Reminders tables if they don't exist."""
         try:
             conn = self.connect()
             cursor = conn.cursor()
             
-            # Create Teams table
+            # Create Teams table (same schema as bot_v20.py)
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS teams (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
-                members TEXT NOT NULL,
                 created_by INTEGER NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             ''')
             
+            # Create Team members table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS team_members (
+                team_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (team_id, user_id),
+                FOREIGN KEY (team_id) REFERENCES teams (id)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_team_members_user_id ON team_members (user_id, team_id)"
+            )
+            
             # Create Reminders table
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS reminders (
@@ -77,12 +93,23 @@ class Database:
             conn = self.connect()
             cursor = conn.cursor()
             
-            # Convert members list to JSON string
-            members_json = ','.join(map(str, members))
-            
-            cursor.execute(
-                "INSERT INTO teams (name, members, created_by) VALUES (?, ?, ?)",
-                (name, members_json, created_by)
+            # Databases created by the first bot version still have a NOT NULL members column;
+            # members are stored in team_members, the column is left empty
+            cursor.execute("PRAGMA table_info(teams)")
+            if any(column[1] == 'members' for column in cursor.fetchall()):
+                cursor.execute(
+                    "INSERT INTO teams (name, members, created_by) VALUES (?, '[]', ?)",
+                    (name, created_by)
+                )
+            else:
+                cursor.execute(
+                    "INSERT INTO teams (name, created_by) VALUES (?, ?)",
+                    (name, created_by)
+                )
+            team_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO team_members (team_id, user_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                [(team_id, member) for member in members]
             )
             
             conn.commit()
@@ -110,42 +137,35 @@ class Database:
             
             if user_id:
                 # Get teams where user is a member or creator
-                cursor.execute("SELECT * FROM teams")
-                all_teams = cursor.fetchall()
-                
-                # Filter teams where user is a member
-                teams = []
-                for team in all_teams:
-                    team_id, name, members_str, created_by, created_at = team
-                    members = list(map(int, members_str.split(',')))
-                    
-                    if user_id in members or user_id == created_by:
-                        teams.append({
-                            'id': team_id,
-                            'name': name,
-                            'members': members,
-                            'created_by': created_by,
-                            'created_at': created_at
-                        })
-                
-                return teams
+                cursor.execute('''
+                SELECT id, name, created_by, created_at FROM teams
+                WHERE created_by = ? OR id IN (SELECT team_id FROM team_members WHERE user_id = ?)
+                ORDER BY id
+                ''', (user_id, user_id))
             else:
                 # Get all teams
-                cursor.execute("SELECT * FROM teams")
-                teams = []
-                for team in cursor.fetchall():
-                    team_id, name, members_str, created_by, created_at = team
-                    members = list(map(int, members_str.split(',')))
-                    
-                    teams.append({
-                        'id': team_id,
-                        'name': name,
-                        'members': members,
-                        'created_by': created_by,
-                        'created_at': created_at
-                    })
-                
-                return teams
+                cursor.execute("SELECT id, name, created_by, created_at FROM teams ORDER BY id")
+            rows = cursor.fetchall()
+            
+            # Members of the selected teams in one query
+            members = {row[0]: [] for row in rows}
+            cursor.execute(
+                "SELECT team_id, user_id FROM team_members WHERE team_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(members)),)
+            )
+            for team_id, member in cursor.fetchall():
+                members[team_id].append(member)
+            
+            return [
+                {
+                    'id': team_id,
+                    'name': name,
+                    'members': members[team_id],
+                    'created_by': created_by,
+                    'created_at': created_at
+                }
+                for team_id, name, created_by, created_at in rows
+            ]
         except sqlite3.Error as e:
             logger.error(f"Error getting teams: {e}")
             return []
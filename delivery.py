@@ -0,0 +1,217 @@
+"""
+Отправка сообщений в Telegram.
+
+Сообщения уходят параллельно (не больше заданного числа одновременно) и
+с учётом ограничений Telegram: общий лимит сообщений в секунду и лимит
+на каждый чат. Ошибки делятся на временные (повторяем позже) и постоянные.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque, namedtuple
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SEND_LATENCY = metrics.histogram('telegram_send_seconds', 'Длительность одного запроса send_message')
+
+# Результаты отправки сообщения
+SENT, RETRY, FAILED = 'sent', 'retry', 'failed'
+
+# status - один из SENT/RETRY/FAILED, retry_after - сколько секунд просил подождать Telegram
+SendResult = namedtuple('SendResult', ['status', 'retry_after', 'error'])
+
+# Максимальная длина сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Параметры экспоненциальной задержки между повторами
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 3600
+RETRY_MAX_ATTEMPTS = 8
+
+
+def retry_delay(attempts, retry_after=None):
+    """Задержка перед следующей попыткой отправки.
+    
+    Args:
+        attempts (int): Сколько попыток уже было сделано
+        retry_after (float, optional): Задержка, которую потребовал Telegram
+        
+    Returns:
+        float: Задержка в секундах
+    """
+    if retry_after:
+        # Telegram точно говорит, сколько ждать; добавляем немного, чтобы не прийти раньше
+        return retry_after + random.uniform(0, 1)
+    delay = min(RETRY_BASE_DELAY * 2 ** attempts, RETRY_MAX_DELAY)
+    # Случайный разброс, чтобы повторы не приходили одной волной
+    return random.uniform(delay / 2, delay)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """Инициализация ведра токенов.
+
+        Args:
+            rate (float): Сколько токенов добавляется в секунду
+            capacity (float, optional): Максимальное количество токенов (по умолчанию rate)
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def block(self, seconds):
+        """Запрет выдачи токенов на указанное время."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self):
+        """Ведро полное - им давно не пользовались."""
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Ожидание и получение одного токена."""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendEngine:
+    # Сколько ведер отдельных чатов держать, прежде чем чистить неиспользуемые
+    MAX_CHAT_BUCKETS = 10000
+    # Окно (в секундах) для расчёта пропускной способности
+    THROUGHPUT_WINDOW = 60
+
+    def __init__(self, bot, concurrency=20, global_rate=25, chat_rate=1, chat_burst=3):
+        """Инициализация движка отправки.
+
+        Args:
+            bot (Bot): Бот, через который отправляются сообщения
+            concurrency (int): Максимум одновременных запросов к Telegram
+            global_rate (float): Общий лимит сообщений в секунду
+            chat_rate (float): Лимит сообщений в секунду для одного чата
+            chat_burst (int): Сколько сообщений подряд можно отправить в один чат
+        """
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._sent_times = deque()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.queued = 0
+        self.in_flight = 0
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.is_full()
+                }
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def send(self, chat_id, text):
+        """Отправка одного сообщения с учётом лимитов.
+
+        Returns:
+            SendResult: Результат отправки
+        """
+        self.queued += 1
+        waiting = True
+        bucket = self._chat_bucket(chat_id)
+        try:
+            await bucket.acquire()
+            async with self._semaphore:
+                await self._global_bucket.acquire()
+                self.queued -= 1
+                waiting = False
+                self.in_flight += 1
+                started = time.monotonic()
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=text)
+                finally:
+                    self.in_flight -= 1
+                    SEND_LATENCY.observe(time.monotonic() - started)
+        except RetryAfter as e:
+            # В новых версиях python-telegram-bot retry_after - timedelta, в 20.x - секунды
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            # Остальные сообщения в этот чат тоже придержим
+            bucket.block(retry_after)
+            # Лимит может быть общим для бота: пока он не снят, новые запросы тоже получат 429
+            self._global_bucket.block(retry_after)
+            self.retried += 1
+            logger.warning(f"Telegram просит подождать {retry_after} с перед отправкой в чат {chat_id}")
+            return SendResult(RETRY, retry_after, str(e))
+        except (BadRequest, Forbidden) as e:
+            # Чат не существует, бот заблокирован и т.п. - повтор не поможет
+            self.failed += 1
+            logger.error(f"Ошибка отправки сообщения в чат {chat_id}: {e}")
+            return SendResult(FAILED, None, str(e))
+        except (TimedOut, NetworkError) as e:
+            self.retried += 1
+            logger.warning(f"Временная ошибка отправки сообщения в чат {chat_id}: {e}")
+            return SendResult(RETRY, None, str(e))
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка отправки сообщения в чат {chat_id}: {e}")
+            return SendResult(FAILED, None, str(e))
+        finally:
+            if waiting:
+                self.queued -= 1
+
+        self.sent += 1
+        self._sent_times.append(time.monotonic())
+        return SendResult(SENT, None, None)
+
+    async def send_many(self, messages):
+        """Параллельная отправка нескольких сообщений.
+
+        Args:
+            messages (iterable): Пары (chat_id, text)
+
+        Returns:
+            list: SendResult для каждого сообщения
+        """
+        return await asyncio.gather(*(self.send(chat_id, text) for chat_id, text in messages))
+
+    def throughput(self):
+        """Количество отправленных сообщений в секунду за последнюю минуту."""
+        border = time.monotonic() - self.THROUGHPUT_WINDOW
+        while self._sent_times and self._sent_times[0] < border:
+            self._sent_times.popleft()
+        return len(self._sent_times) / self.THROUGHPUT_WINDOW
+
+    def stats(self):
+        """Текущее состояние движка отправки."""
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'queue_depth': self.queued,
+            'in_flight': self.in_flight,
+            'throughput': round(self.throughput(), 2)
+        }
@@ -0,0 +1,123 @@
+"""
+Метрики планировщика и отправки сообщений.
+
+Гистограммы хранятся в памяти процесса: их можно посмотреть через snapshot()
+или выгрузить в текстовом формате Prometheus (например, в файл для textfile
+collector у node_exporter).
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин для времени в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600)
+# Границы корзин для количества строк/напоминаний
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_registry = {}
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        """Инициализация гистограммы.
+
+        Args:
+            name (str): Имя метрики
+            description (str): Описание метрики
+            buckets (iterable): Верхние границы корзин
+        """
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Запись одного значения."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (линейно внутри корзины)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = self.buckets[index - 1] if index > 0 else 0.0
+                high = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        """Сводка по гистограмме."""
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'max': round(self.max, 6)
+        }
+
+    def prometheus(self):
+        """Строки гистограммы в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def histogram(name, description, buckets=LATENCY_BUCKETS):
+    """Получение гистограммы по имени (создаётся при первом обращении)."""
+    if name not in _registry:
+        _registry[name] = Histogram(name, description, buckets)
+    return _registry[name]
+
+
+def snapshot():
+    """Сводка по всем метрикам процесса."""
+    return {name: metric.snapshot() for name, metric in sorted(_registry.items())}
+
+
+def to_prometheus():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    lines = []
+    for _, metric in sorted(_registry.items()):
+        lines.extend(metric.prometheus())
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Атомарная запись метрик в файл (для textfile collector)."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        file.write(to_prometheus())
+    os.replace(temp_path, path)
+
+
+async def export_loop(path, interval=15):
+    """Периодическая выгрузка метрик в файл."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            write_prometheus(path)
+        except OSError as e:
+            logger.error(f"Ошибка записи метрик в {path}: {e}")
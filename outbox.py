@@ -0,0 +1,183 @@
+"""
+Отправка сообщений из очереди outbox.
+
+Планировщик записывает готовые сообщения в таблицу outbox, а OutboxSender
+забирает их пачками и отправляет через SendEngine. Отправитель может работать
+в процессе бота или отдельно (sender.py); несколько отправителей не получают
+одно и то же сообщение. Сообщения с временной ошибкой остаются в outbox и
+отправляются повторно с задержкой, с постоянной ошибкой - удаляются.
+
+Сообщения пачки, адресованные одному чату, объединяются в одно сообщение
+Telegram (или несколько, если не помещаются в ограничение длины), так что
+число запросов к Telegram зависит от числа получателей, а не напоминаний.
+Слишком длинное сообщение отправляется частями; после каждой доставленной
+части в outbox остаётся только неотправленный остаток, поэтому повтор после
+ошибки не присылает уже доставленные части.
+"""
+
+import asyncio
+import logging
+import time
+
+import metrics
+from delivery import MAX_MESSAGE_LENGTH, RETRY, RETRY_MAX_ATTEMPTS, SENT, retry_delay
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_LAG = metrics.histogram(
+    'reminder_delivery_lag_seconds', 'Задержка доставки сообщения относительно времени напоминания', metrics.LAG_BUCKETS
+)
+
+# Разделитель объединённых сообщений
+MESSAGE_SEPARATOR = "\n\n"
+
+
+def coalesce(messages, limit=MAX_MESSAGE_LENGTH):
+    """Объединение сообщений одного чата в минимальное число сообщений Telegram.
+
+    Слишком длинное сообщение разрезается на части по limit символов.
+
+    Args:
+        messages (list): Сообщения outbox в порядке отправки
+        limit (int): Максимальная длина одного сообщения
+
+    Returns:
+        list: Тройки (текст, сообщения outbox, полностью вошедшие в него к этому моменту,
+            разрезанное сообщение и его неотправленный после этого текста остаток или None)
+    """
+    chunks = []
+    current = None
+    completed = []
+    for message in messages:
+        text = message['text']
+        starts = range(0, len(text), limit) or [0]
+        for start in starts:
+            piece = text[start:start + limit]
+            if current is not None and len(current) + len(MESSAGE_SEPARATOR) + len(piece) > limit:
+                chunks.append((current, completed, None))
+                current, completed = None, []
+            current = piece if current is None else current + MESSAGE_SEPARATOR + piece
+            if start + limit < len(text):
+                # Не последняя часть: сообщение ещё не доставлено целиком
+                chunks.append((current, completed, (message, text[start + limit:])))
+                current, completed = None, []
+        completed.append(message)
+    if current is not None:
+        chunks.append((current, completed, None))
+    return chunks
+
+
+class OutboxSender:
+    def __init__(self, db, batch=100, poll_interval=1, claim_timeout=300):
+        """Инициализация отправителя.
+
+        Args:
+            db (AsyncDatabase): База данных с очередью outbox
+            batch (int): Сколько сообщений outbox забирать за раз
+            poll_interval (float): Как часто проверять outbox без уведомлений от планировщика
+            claim_timeout (int): Через сколько секунд сообщение упавшего отправителя отправится снова
+        """
+        self.db = db
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.engine = None
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+
+    def start(self, engine):
+        """Запуск отправителя.
+
+        Args:
+            engine (SendEngine): Движок отправки сообщений
+        """
+        self.engine = engine
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Отправитель сообщений из outbox запущен")
+
+    async def stop(self):
+        """Остановка отправителя. Неотправленные сообщения остаются в outbox."""
+        for task in (self._task, *self._inflight):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        logger.info("Отправитель сообщений из outbox остановлен")
+
+    def notify(self):
+        """Уведомление о новых сообщениях в outbox."""
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _on_done(self, task):
+        self._inflight.discard(task)
+        # Освободилось место для следующих сообщений
+        self._wakeup.set()
+
+    async def _send_chat(self, chat_id, messages):
+        """Отправка сообщений одного чата и запись результата в outbox."""
+        pending = list(messages)
+        for text, completed, partial in coalesce(messages):
+            result = await self.engine.send(chat_id, text)
+            if result.status != SENT:
+                await self._fail(chat_id, pending, result)
+                return
+            if completed:
+                await self.db.complete_outbox([message['id'] for message in completed])
+            now = time.time()
+            for message in completed:
+                if message['fire_at'] is not None:
+                    DELIVERY_LAG.observe(max(now - message['fire_at'], 0))
+            pending = pending[len(completed):]
+            if partial:
+                # В outbox остаётся только неотправленная часть длинного сообщения
+                message, rest = partial
+                await self.db.truncate_outbox(message['id'], rest)
+
+    async def _fail(self, chat_id, messages, result):
+        """Перенос или отмена неотправленных сообщений чата."""
+        attempts = [message['attempts'] + 1 for message in messages]
+        if result.status == RETRY and max(attempts) < RETRY_MAX_ATTEMPTS:
+            # Общее время повтора, чтобы сообщения снова ушли одним
+            next_attempt_at = time.time() + retry_delay(max(attempts) - 1, result.retry_after)
+            await self.db.reschedule_outbox([message['id'] for message in messages], attempts, next_attempt_at, result.error)
+            return
+        await self.db.complete_outbox(
+            [message['id'] for message in messages],
+            failed_reminder_ids=[message['reminder_id'] for message in messages]
+        )
+        logger.error(
+            f"Не доставлено сообщений в чат {chat_id}: {len(messages)} "
+            f"(попыток: {max(attempts)}): {result.error}"
+        )
+
+    async def _run(self):
+        while True:
+            free = self.batch - len(self._inflight)
+            # Добираем сообщения, когда освободилась хотя бы половина мест, а не после каждого
+            messages = []
+            if free >= max(self.batch // 2, 1):
+                messages = await self.db.claim_outbox(free, self.claim_timeout)
+            by_chat = {}
+            for message in messages:
+                by_chat.setdefault(message['chat_id'], []).append(message)
+            for chat_id, chat_messages in by_chat.items():
+                task = asyncio.create_task(self._send_chat(chat_id, chat_messages))
+                self._inflight.add(task)
+                task.add_done_callback(self._on_done)
+            if messages and len(messages) == free:
+                # Вероятно, в outbox есть ещё сообщения
+                await asyncio.sleep(0)
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
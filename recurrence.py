@@ -0,0 +1,173 @@
+"""
+Правила повторения напоминаний.
+
+Поддерживаются правила:
+    daily          - каждый день в то же время
+    weekly         - каждую неделю в тот же день недели и время
+    monthly:<day>  - каждый месяц в указанный день (в коротких месяцах - в последний день)
+    cron:<expr>    - выражение cron из 5 полей: минута, час, день месяца, месяц, день недели
+
+Время правил - локальное, как и reminder_time.
+"""
+
+import calendar
+from datetime import datetime, timedelta
+
+# Границы полей cron: (минимум, максимум)
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+# Сколько дней вперёд искать следующее срабатывание cron (покрывает 29 февраля)
+CRON_SEARCH_DAYS = 366 * 5
+
+
+def _parse_cron_field(field, low, high):
+    """Разбор одного поля cron в множество допустимых значений."""
+    # В поле дня недели 7 тоже означает воскресенье
+    is_weekday = (low, high) == (0, 6)
+    top = 7 if is_weekday else high
+
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Некорректный шаг в поле cron: {field}")
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if start < low or end > top or start > end:
+            raise ValueError(f"Значение вне диапазона в поле cron: {field}")
+        values.update(range(start, end + 1, step))
+
+    if is_weekday and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+def parse_cron(expression):
+    """Разбор выражения cron.
+
+    Args:
+        expression (str): Выражение из 5 полей
+
+    Returns:
+        list: Множества допустимых значений полей и признаки ограничения дня месяца и недели
+    """
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError("Выражение cron должно состоять из 5 полей")
+    parsed = [_parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)]
+    return parsed, fields[2] != '*', fields[4] != '*'
+
+
+def _cron_day_matches(day, parsed, dom_restricted, dow_restricted):
+    _, _, days, months, weekdays = parsed
+    if day.month not in months:
+        return False
+    dom_match = day.day in days
+    # В cron воскресенье - 0, в Python - 6
+    dow_match = (day.weekday() + 1) % 7 in weekdays
+    # Если ограничены и день месяца, и день недели, достаточно совпадения любого из них
+    if dom_restricted and dow_restricted:
+        return dom_match or dow_match
+    return dom_match and dow_match
+
+
+def _next_cron(expression, after):
+    parsed, dom_restricted, dow_restricted = parse_cron(expression)
+    minutes, hours = sorted(parsed[0]), sorted(parsed[1])
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+    day = start.replace(hour=0, minute=0)
+    for _ in range(CRON_SEARCH_DAYS):
+        if _cron_day_matches(day, parsed, dom_restricted, dow_restricted):
+            for hour in hours:
+                for minute in minutes:
+                    candidate = day.replace(hour=hour, minute=minute)
+                    if candidate >= start:
+                        return candidate
+        day += timedelta(days=1)
+    raise ValueError(f"Выражение cron никогда не срабатывает: {expression}")
+
+
+def _add_month(moment, day_of_month):
+    year = moment.year + moment.month // 12
+    month = moment.month % 12 + 1
+    day = min(day_of_month, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def validate_rule(rule):
+    """Проверка правила повторения. Выбрасывает ValueError, если правило некорректно."""
+    if rule in ('daily', 'weekly'):
+        return
+    if rule.startswith('monthly:'):
+        if not 1 <= int(rule[len('monthly:'):]) <= 31:
+            raise ValueError(f"Некорректный день месяца: {rule}")
+        return
+    if rule.startswith('cron:'):
+        parse_cron(rule[len('cron:'):])
+        return
+    raise ValueError(f"Неизвестное правило повторения: {rule}")
+
+
+def next_occurrence(rule, previous, now=None):
+    """Следующее срабатывание правила позже текущего момента.
+
+    Пропущенные срабатывания (например, пока бот был выключен) не возвращаются:
+    результат всегда позже now.
+
+    Args:
+        rule (str): Правило повторения
+        previous (datetime): Время предыдущего срабатывания
+        now (datetime, optional): Текущее время (по умолчанию datetime.now())
+
+    Returns:
+        datetime: Время следующего срабатывания
+    """
+    now = now or datetime.now()
+    if rule.startswith('cron:'):
+        return _next_cron(rule[len('cron:'):], max(previous, now))
+
+    if rule == 'daily' or rule == 'weekly':
+        step = timedelta(days=1 if rule == 'daily' else 7)
+        # Сразу перескакиваем через пропущенные периоды
+        missed = max((now - previous) // step, 0)
+        moment = previous + step * missed
+        while moment <= now or moment <= previous:
+            moment += step
+        return moment
+
+    if rule.startswith('monthly:'):
+        day_of_month = int(rule[len('monthly:'):])
+        moment = _add_month(previous, day_of_month)
+        while moment <= now:
+            moment = _add_month(moment, day_of_month)
+        return moment
+
+    raise ValueError(f"Неизвестное правило повторения: {rule}")
+
+
+def describe_rule(rule):
+    """Описание правила повторения для пользователя."""
+    if not rule:
+        return "однократно"
+    if rule == 'daily':
+        return "каждый день"
+    if rule == 'weekly':
+        return "каждую неделю"
+    if rule.startswith('monthly:'):
+        return f"каждый месяц {rule[len('monthly:'):]} числа"
+    if rule.startswith('cron:'):
+        return f"по расписанию {rule[len('cron:'):]}"
+    return rule
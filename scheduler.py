@@ -0,0 +1,296 @@
+"""
+Планировщик напоминаний.
+
+Держит в памяти кучу ближайших напоминаний (в пределах горизонта) и ровно в
+секунду срабатывания переводит их в очередь отправки (outbox) в базе, без
+периодического пересканирования базы. Сам планировщик в Telegram не отправляет:
+этим занимается OutboxSender, в том же или в отдельном процессе, так что
+медленная отправка не задерживает срабатывание следующих напоминаний.
+Просроченные необработанные напоминания ставятся в очередь пачками.
+
+Напоминания разбиты на разделы. Несколько процессов планировщика (в том числе
+на разных машинах с общей базой) арендуют разделы в базе и продлевают аренду;
+разделы упавшего процесса после истечения аренды забирают оставшиеся.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+import socket
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TICK_DURATION = metrics.histogram('scheduler_tick_seconds', 'Длительность одного срабатывания цикла планировщика')
+DUE_COUNT = metrics.histogram(
+    'scheduler_due_reminders', 'Количество напоминаний, сработавших за один цикл', metrics.COUNT_BUCKETS
+)
+ROWS_SCANNED = metrics.histogram(
+    'scheduler_rows_scanned', 'Количество строк напоминаний, прочитанных одним запросом', metrics.COUNT_BUCKETS
+)
+ENQUEUE_LAG = metrics.histogram(
+    'scheduler_enqueue_lag_seconds', 'Задержка постановки в outbox относительно времени напоминания', metrics.LAG_BUCKETS
+)
+
+
+class ReminderScheduler:
+    def __init__(self, db, partitions, horizon=3600, catchup_batch=100,
+                 lease_ttl=30, poll_interval=2, worker_id=None):
+        """Инициализация планировщика.
+
+        Args:
+            db (AsyncDatabase): База данных с напоминаниями
+            partitions (int): Общее количество разделов напоминаний
+            horizon (int): На сколько секунд вперёд загружать напоминания в память
+            catchup_batch (int): Размер пачки при обработке просроченных напоминаний
+            lease_ttl (int): Срок аренды раздела в секундах
+            poll_interval (int): Как часто проверять напоминания, добавленные другими процессами
+            worker_id (str, optional): Идентификатор процесса (по умолчанию хост:PID)
+        """
+        self.db = db
+        self.partitions = partitions
+        self.horizon = horizon
+        self.catchup_batch = catchup_batch
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.on_enqueue = None
+        self._loop = None
+        self.shards = set()
+        self._leases_valid_until = 0
+        self._heap = []  # (fire_at, reminder_id)
+        self._entries = {}  # reminder_id -> напоминание
+        self._loaded_until = 0
+        self._max_seen_id = 0
+        self._wakeup = None
+        self._tasks = []
+        self._inflight = set()
+
+    async def start(self, on_enqueue=None):
+        """Запуск планировщика.
+
+        Args:
+            on_enqueue (callable, optional): Вызывается после постановки сообщений в outbox
+        """
+        self.on_enqueue = on_enqueue
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._loaded_until = int(time.time())
+        self._max_seen_id = await self.db.get_max_reminder_id()
+        await self._rebalance()
+        await self._extend()
+        self._tasks = [
+            asyncio.create_task(self._run()),
+            asyncio.create_task(self._lease_loop()),
+            asyncio.create_task(self._poll_loop())
+        ]
+        logger.info(
+            f"Планировщик {self.worker_id} запущен: разделов {len(self.shards)}, "
+            f"в памяти {len(self._entries)} напоминаний"
+        )
+
+    async def stop(self):
+        """Остановка планировщика и освобождение разделов."""
+        for task in (*self._tasks, *self._inflight):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._loop = None
+        await self.db.release_leases(self.worker_id)
+        self.shards = set()
+        logger.info(f"Планировщик {self.worker_id} остановлен")
+
+    def schedule(self, reminder):
+        """Добавление нового напоминания. Можно вызывать из любого потока (в том числе из потока базы)."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule, reminder)
+
+    def cancel(self, reminder_id):
+        """Отмена напоминания. Можно вызывать из любого потока."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel, reminder_id)
+
+    def _schedule(self, reminder):
+        """Добавление напоминания, если оно относится к своим разделам и горизонту."""
+        if reminder['shard'] not in self.shards or reminder['fire_at'] >= self._loaded_until:
+            # Будет загружено из базы при расширении горизонта или другим процессом
+            return
+        self._push(reminder)
+        self._wakeup.set()
+
+    def _cancel(self, reminder_id):
+        """Отмена напоминания. Запись в куче удаляется лениво при извлечении."""
+        self._entries.pop(reminder_id, None)
+
+    def _push(self, reminder):
+        self._entries[reminder['id']] = reminder
+        heapq.heappush(self._heap, (reminder['fire_at'], reminder['id']))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _extend(self):
+        """Загрузка напоминаний своих разделов из базы до нового края горизонта."""
+        until = int(time.time()) + self.horizon
+        if self.shards:
+            reminders = await self.db.get_due_reminders(self._loaded_until, until, shards=self.shards)
+            ROWS_SCANNED.observe(len(reminders))
+            for reminder in reminders:
+                self._push(reminder)
+        self._loaded_until = until
+
+    async def _rebalance(self):
+        """Продление аренды и перераспределение разделов между живыми процессами."""
+        live_workers = await self.db.heartbeat_worker(self.worker_id, self.lease_ttl)
+        fair_share = math.ceil(self.partitions / max(live_workers, 1))
+
+        owned = await self.db.renew_leases(self.worker_id, self.lease_ttl)
+        if owned is None:
+            # База недоступна: не отправляем, пока аренда не подтверждена
+            return
+        self._leases_valid_until = time.time() + self.lease_ttl
+
+        if len(owned) > fair_share:
+            # Отдаём лишние разделы
+            extra = set(sorted(owned, reverse=True)[:len(owned) - fair_share])
+            self._drop(extra)
+            await self.db.release_leases(self.worker_id, extra)
+            owned -= extra
+        elif len(owned) < fair_share:
+            owned |= await self.db.claim_leases(self.worker_id, fair_share - len(owned), self.lease_ttl)
+
+        lost = self.shards - owned
+        gained = owned - self.shards
+        self._drop(lost)
+        self.shards = owned
+        if gained:
+            await self._gain(gained)
+        if lost or gained:
+            logger.info(
+                f"Планировщик {self.worker_id}: разделов {len(owned)} "
+                f"(получено {len(gained)}, отдано {len(lost)})"
+            )
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _gain(self, shards):
+        """Загрузка напоминаний полученных разделов и обработка просроченных."""
+        now = int(time.time())
+        self._spawn(self._catch_up(now, shards))
+        reminders = await self.db.get_due_reminders(now, self._loaded_until, shards=shards)
+        ROWS_SCANNED.observe(len(reminders))
+        for reminder in reminders:
+            self._push(reminder)
+
+    def _drop(self, shards):
+        """Удаление из памяти напоминаний разделов, которые больше не принадлежат процессу."""
+        if not shards:
+            return
+        for reminder_id in [rid for rid, r in self._entries.items() if r['shard'] in shards]:
+            del self._entries[reminder_id]
+
+    async def _deliver(self, reminders):
+        """Постановка сработавших напоминаний в очередь отправки."""
+        now = time.time()
+        for reminder in reminders:
+            ENQUEUE_LAG.observe(max(now - reminder['fire_at'], 0))
+        # Время срабатывания передаётся вместе с ID: уже перенесённое напоминание не обработается дважды
+        rescheduled = await self.db.enqueue_reminders(
+            [(reminder['id'], reminder['fire_at']) for reminder in reminders]
+        )
+        # Повторяющиеся напоминания возвращаются в кучу со следующим временем
+        for reminder in rescheduled:
+            self._schedule(reminder)
+        if self.on_enqueue:
+            self.on_enqueue()
+
+    async def _catch_up(self, before_ts, shards):
+        """Постановка в очередь необработанных напоминаний разделов, время которых уже прошло."""
+        total = 0
+        last_batch = None
+        # Разделы могут уйти другому процессу во время обработки
+        while shards & self.shards:
+            shards = shards & self.shards
+            reminders = await self.db.get_due_reminders(0, before_ts, limit=self.catchup_batch, shards=shards)
+            ROWS_SCANNED.observe(len(reminders))
+            batch_ids = [reminder['id'] for reminder in reminders]
+            # Пустая пачка - всё обработано; повтор той же пачки - ошибка записи в базу
+            if not reminders or batch_ids == last_batch:
+                break
+            last_batch = batch_ids
+            await self._deliver(reminders)
+            total += len(reminders)
+        if total:
+            logger.info(f"Поставлены в очередь просроченные напоминания: {total}")
+
+    def _pop_due(self, now):
+        """Извлечение из кучи всех напоминаний, время которых наступило."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, reminder_id = heapq.heappop(self._heap)
+            reminder = self._entries.get(reminder_id)
+            # Отменённое или перенесённое напоминание
+            if reminder is None or reminder['fire_at'] != fire_at:
+                continue
+            del self._entries[reminder_id]
+            due.append(reminder)
+        return due
+
+    async def _lease_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self._rebalance()
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды разделов: {e}")
+
+    async def _poll_loop(self):
+        """Подхват напоминаний, добавленных другими процессами."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            added = False
+            reminders = await self.db.get_reminders_after(self._max_seen_id)
+            ROWS_SCANNED.observe(len(reminders))
+            for reminder in reminders:
+                self._max_seen_id = reminder['id']
+                if (reminder['status'] == 'pending' and reminder['id'] not in self._entries
+                        and reminder['shard'] in self.shards and reminder['fire_at'] < self._loaded_until):
+                    self._push(reminder)
+                    added = True
+            if added:
+                self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            started = time.monotonic()
+            if now + self.horizon / 2 >= self._loaded_until:
+                await self._extend()
+
+            timeout = self._loaded_until - self.horizon / 2 - time.time()
+            if now < self._leases_valid_until:
+                due = self._pop_due(now)
+                if due:
+                    DUE_COUNT.observe(len(due))
+                    await self._deliver(due)
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - time.time())
+            # Иначе аренда не подтверждена (разделы могли уйти другому процессу):
+            # ждём следующего продления, оно разбудит цикл
+            TICK_DURATION.observe(time.monotonic() - started)
+
+            # Спим до ближайшего напоминания или до следующего расширения горизонта
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,35 @@
+"""
+Отдельный процесс отправки сообщений из очереди outbox.
+
+Можно запустить несколько таких процессов рядом с ботом и планировщиком:
+каждое сообщение outbox забирает только один из них.
+Запуск: python sender.py
+"""
+
+import asyncio
+
+from telegram import Bot
+
+from bot_v20 import TOKEN, create_send_engine, db, logger, sender, start_metrics_export
+
+
+async def run_sender():
+    """Запуск отправки сообщений без обработки сообщений пользователей и планирования."""
+    async with Bot(TOKEN) as bot:
+        sender.start(create_send_engine(bot))
+        metrics_task = start_metrics_export()
+        try:
+            # Работаем, пока процесс не остановят
+            await asyncio.Event().wait()
+        finally:
+            if metrics_task:
+                metrics_task.cancel()
+            await sender.stop()
+            await db.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_sender())
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("👋 Отправитель остановлен пользователем.")
@@ -0,0 +1,249 @@
+"""
+Общие настройки подключения к базе данных.
+
+По умолчанию данные хранятся в SQLite; PostgreSQL включается в config.json
+(см. postgres.py). Бэкенд выбирает create_backend, а различия в SQL между
+СУБД описывает диалект (Dialect).
+
+Бот, планировщик (worker.py), отправитель (sender.py) и сайт (app.py)
+работают с одним файлом базы. База переводится в режим WAL: читатели не
+блокируют запись и видят последнее зафиксированное состояние, а запись
+ждёт освобождения базы (busy_timeout) вместо ошибки "database is locked".
+Журнал WAL периодически переносится в основной файл (checkpoint).
+
+Сайт берёт соединения из пула: они переиспользуются между запросами вместе
+с кэшем подготовленных запросов.
+"""
+
+import asyncio
+import logging
+import queue
+import re
+import sqlite3
+from contextlib import contextmanager
+
+from archive import register_functions
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "bot_database.db"
+
+# Ошибки базы данных любого из бэкендов
+DATABASE_ERRORS = (sqlite3.Error,) + ((psycopg2.Error,) if psycopg2 else ())
+
+# Запросы бота используют RETURNING, который появился в SQLite 3.35
+MIN_SQLITE_VERSION = (3, 35)
+
+# Сколько миллисекунд ждать освобождения базы другим процессом
+BUSY_TIMEOUT = 5000
+# Сколько подготовленных запросов хранить в каждом соединении
+CACHED_STATEMENTS = 256
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В режиме WAL достаточно NORMAL: при сбое питания теряется только последняя транзакция
+    'synchronous': 'NORMAL',
+    'busy_timeout': BUSY_TIMEOUT,
+    # Отрицательное значение - размер кэша страниц в КиБ (64 МиБ)
+    'cache_size': -65536,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    # Автоматический checkpoint после 1000 страниц журнала, если периодический не успевает
+    'wal_autocheckpoint': 1000,
+    # Внешние ключи: напоминания команды удаляются вместе с ней (ON DELETE CASCADE)
+    'foreign_keys': 'ON'
+}
+
+
+def connect(db_name=DB_NAME, readonly=False, row_factory=sqlite3.Row, check_same_thread=True):
+    """Открытие соединения с базой с общими настройками.
+
+    Args:
+        db_name (str): Путь к файлу базы
+        readonly (bool): Соединение только для чтения (для сайта)
+        row_factory (callable, optional): Фабрика строк результата (None - кортежи)
+        check_same_thread (bool): Запрещать использование соединения из других потоков
+
+    Returns:
+        sqlite3.Connection: Соединение с базой
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        # Не ошибка базы: бот не должен запускаться со старой SQLite
+        raise RuntimeError(
+            f"Нужна SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} или новее, установлена {sqlite3.sqlite_version}"
+        )
+    conn = sqlite3.connect(
+        db_name,
+        timeout=BUSY_TIMEOUT / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=check_same_thread
+    )
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    conn.row_factory = row_factory
+    register_functions(conn)
+    return conn
+
+
+def checkpoint(conn, mode="PASSIVE"):
+    """Перенос журнала WAL в основной файл базы.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой
+        mode (str): PASSIVE (не ждёт читателей) или TRUNCATE (ещё и обрезает журнал)
+
+    Returns:
+        tuple: (занята ли база, страниц в журнале, перенесено страниц)
+    """
+    return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+
+async def checkpoint_loop(db, interval=300):
+    """Периодический checkpoint журнала WAL.
+
+    Args:
+        db (AsyncDatabase): База данных (checkpoint выполняется в её потоке)
+        interval (int): Как часто выполнять checkpoint (в секундах)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            busy, log_pages, moved = await db.checkpoint()
+            if busy:
+                logger.warning(f"Checkpoint не завершён: перенесено {moved} из {log_pages} страниц журнала")
+        except DATABASE_ERRORS as e:
+            logger.error(f"Ошибка checkpoint базы данных: {e}")
+
+
+class ConnectionPool:
+    def __init__(self, db_name=DB_NAME, size=4, readonly=False):
+        """Инициализация пула соединений.
+
+        Args:
+            db_name (str): Путь к файлу базы
+            size (int): Сколько свободных соединений хранить
+            readonly (bool): Открывать соединения только для чтения
+        """
+        self.db_name = db_name
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула на время блока with."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = connect(self.db_name, readonly=self.readonly, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            # Незавершённое чтение не должно удерживать снимок базы
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Закрытие всех свободных соединений."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class Dialect:
+    """Фрагменты SQL, которые различаются между СУБД (здесь - для SQLite)."""
+    name = 'sqlite'
+    # Подзапрос со значениями JSON-массива из параметра (для IN)
+    id_list = "SELECT value FROM json_each(?)"
+    text_list = "SELECT value FROM json_each(?)"
+    # Функция форматирования текста по шаблону с %s
+    format_function = "printf"
+    # Блокировка строк, выбранных для захвата (SQLite блокирует всю базу)
+    skip_locked = ""
+    # Полнотекстовый поиск по напоминаниям: источник строк, условие совпадения и порядок по релевантности.
+    # Параметр - поисковый запрос из search_query
+    search_source = "reminders_fts JOIN reminders ON reminders.id = reminders_fts.rowid"
+    search_match = "reminders_fts MATCH ?"
+    search_rank = "bm25(reminders_fts)"
+
+    def search_query(self, text):
+        """Поисковый запрос FTS5 из текста пользователя: все слова, каждое как префикс (None - слов нет)."""
+        words = re.findall(r"\w+", text)
+        return " ".join(f'"{word}"*' for word in words) or None
+
+    def json_rows(self, *columns):
+        """Подзапрос, превращающий JSON-массив массивов из параметра в строки с целыми колонками."""
+        return "SELECT " + ", ".join(
+            f"json_extract(value, '$[{index}]') AS {column}" for index, column in enumerate(columns)
+        ) + " FROM json_each(?)"
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    dialect = Dialect()
+
+    def __init__(self, db_name=DB_NAME, pool_size=4):
+        """Инициализация бэкенда SQLite.
+
+        Args:
+            db_name (str): Путь к файлу базы
+            pool_size (int): Сколько свободных соединений для чтения хранить
+        """
+        self.db_name = db_name
+        self._pool = ConnectionPool(db_name, size=pool_size, readonly=True)
+
+    def connect(self, readonly=False, check_same_thread=True):
+        """Новое соединение с базой."""
+        return connect(self.db_name, readonly=readonly, check_same_thread=check_same_thread)
+
+    def connection(self):
+        """Соединение для чтения из пула на время блока with."""
+        return self._pool.connection()
+
+    def checkpoint(self, conn, mode="PASSIVE"):
+        return checkpoint(conn, mode)
+
+    def stream(self, conn, sql, params=(), batch=1000):
+        """Построчное чтение большой выборки порциями по batch строк."""
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self._pool.close()
+
+
+def create_backend(settings=None):
+    """Бэкенд базы данных по настройкам "database" из config.json.
+
+    Args:
+        settings (dict, optional): {"backend": "sqlite", "path": ...} или
+            {"backend": "postgres", "dsn": ..., "pool_size": ...}
+
+    Returns:
+        SQLiteBackend | PostgresBackend: Бэкенд базы данных
+    """
+    settings = settings or {}
+    backend = settings.get("backend", "sqlite")
+    if backend == "sqlite":
+        return SQLiteBackend(settings.get("path", DB_NAME), settings.get("pool_size", 4))
+    if backend == "postgres":
+        # psycopg2 нужен только для PostgreSQL
+        from postgres import PostgresBackend
+        return PostgresBackend(settings["dsn"], settings.get("pool_size", 10))
+    raise ValueError(f"Неизвестный бэкенд базы данных: {backend}")
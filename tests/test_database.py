@@ -0,0 +1,238 @@
+"""
+Тесты базы данных бота.
+
+bot_v20 при импорте читает config.json и открывает базу в текущем каталоге,
+поэтому тесты работают во временном каталоге. Нужны зависимости из
+requirements.txt. Запуск: python -m unittest discover tests
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+# Модули бота импортируются из корня репозитория, а тесты работают во временном каталоге
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+bot_v20 = None
+workdir = None
+previous_cwd = None
+
+
+def setUpModule():
+    global bot_v20, workdir, previous_cwd
+    previous_cwd = os.getcwd()
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    with open("config.json", "w") as f:
+        json.dump({"TOKEN": "test"}, f)
+    try:
+        import bot_v20 as module
+    except ImportError as e:
+        os.chdir(previous_cwd)
+        workdir.cleanup()
+        raise unittest.SkipTest(f"не установлены зависимости бота: {e}")
+    bot_v20 = module
+
+
+def tearDownModule():
+    bot_v20.database.close()
+    os.chdir(previous_cwd)
+    workdir.cleanup()
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(workdir.name, f"{self.id()}.db")
+
+    def create_legacy_database(self):
+        """База в схеме первой версии бота (команды с JSON-списком участников)."""
+        conn = sqlite3.connect(self.path)
+        conn.executescript('''
+        CREATE TABLE teams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            members TEXT NOT NULL,
+            created_by INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            reminder_time TEXT NOT NULL,
+            reminder_text TEXT NOT NULL,
+            team_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE team_invites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            team_name TEXT NOT NULL,
+            invited_username TEXT NOT NULL,
+            invited_by INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES teams (id)
+        );
+        INSERT INTO teams (name, members, created_by) VALUES ('Команда', '[1, 2]', 1);
+        INSERT INTO reminders (user_id, reminder_time, reminder_text, team_name)
+        VALUES (1, '2099-01-01T10:00:00', 'команде', 'Команда'),
+               (1, '2099-01-01T10:00:00', 'личное', ''),
+               (2, '2099-01-01T10:00:00', 'удалённой команде', 'Удалённая');
+        ''')
+        conn.close()
+
+    def test_legacy_database_with_orphaned_team_reminder(self):
+        self.create_legacy_database()
+        db = bot_v20.Database(db_name=self.path)
+        try:
+            self.assertTrue(db._has_column('reminders', 'team_id'))
+            db.cursor.execute("SELECT reminder_text, team_id FROM reminders ORDER BY id")
+            self.assertEqual([tuple(row) for row in db.cursor.fetchall()], [('команде', 1), ('личное', None)])
+            self.assertEqual(sorted(db.get_team_by_id(1)['members']), [1, 2])
+        finally:
+            db.close()
+
+    def test_legacy_members_column_is_kept_but_not_read(self):
+        self.create_legacy_database()
+        db = bot_v20.Database(db_name=self.path)
+        try:
+            self.assertTrue(db._has_column('teams', 'members'))
+            self.assertTrue(db.remove_user_from_team(1, 2))
+            team_id = db.add_team("Новая", [3], 3)
+            self.assertEqual(db.get_team_by_id(team_id)['members'], [3])
+        finally:
+            db.close()
+        # Повторный запуск не возвращает из старой колонки вышедших участников
+        db = bot_v20.Database(db_name=self.path)
+        try:
+            self.assertEqual(db.get_team_by_id(1)['members'], [1])
+        finally:
+            db.close()
+
+    def test_legacy_comma_separated_members(self):
+        self.create_legacy_database()
+        conn = sqlite3.connect(self.path)
+        conn.execute("UPDATE teams SET members = '1,2'")
+        conn.commit()
+        conn.close()
+        db = bot_v20.Database(db_name=self.path)
+        try:
+            self.assertEqual(sorted(db.get_team_by_id(1)['members']), [1, 2])
+        finally:
+            db.close()
+
+
+class GroupCommitTest(unittest.TestCase):
+    def setUp(self):
+        self.db = bot_v20.Database(db_name=os.path.join(workdir.name, f"{self.id()}.db"))
+
+    def tearDown(self):
+        self.db.close()
+
+    def count_reminders(self):
+        self.db.cursor.execute("SELECT COUNT(*) FROM reminders")
+        return self.db.cursor.fetchone()[0]
+
+    def test_failed_operation_does_not_affect_others(self):
+        results = self.db.run_batch([
+            ('add_reminder', (1, "2099-01-01T10:00:00", "первое"), {}),
+            ('add_reminder', (1, "bad time", "с ошибкой"), {}),
+            ('add_reminder', (2, "2099-01-01T10:00:00", "второе"), {}),
+        ])
+        self.assertEqual(results, [True, False, True])
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.count_reminders(), 2)
+
+    def test_scheduler_learns_about_committed_operations_only(self):
+        scheduled = []
+        # Планировщик вызывается после фиксации пакета
+        self.db.scheduler = mock.Mock(schedule=lambda reminder: scheduled.append(
+            (reminder['reminder_text'], self.db.conn.in_transaction)
+        ))
+        self.db.add_reminder(1, "2099-01-01T10:00:00", "без пакета")
+        self.db.run_batch([
+            ('add_reminder', (1, "2099-01-01T10:00:00", "первое"), {}),
+            ('add_reminder', (1, "bad time", "с ошибкой"), {}),
+            ('delete_reminder', (1,), {}),
+        ])
+        self.assertEqual(scheduled, [("без пакета", False), ("первое", False)])
+        self.db.scheduler.cancel.assert_called_once_with(1)
+
+    def test_failed_batch_is_rolled_back(self):
+        self.db.scheduler = mock.Mock()
+        cursor = self.db.cursor
+        released = []
+
+        def execute(sql, params=()):
+            # Вторая точка сохранения не освобождается: ошибка всей транзакции
+            if sql == "RELEASE batch_operation":
+                released.append(sql)
+                if len(released) == 2:
+                    raise sqlite3.OperationalError("disk I/O error")
+            return cursor.execute(sql, params)
+
+        with mock.patch.object(self.db, 'cursor', mock.Mock(wraps=cursor, execute=execute)):
+            results = self.db.run_batch([
+                ('add_reminder', (1, "2099-01-01T10:00:00", "первое"), {}),
+                ('add_reminder', (2, "2099-01-01T10:00:00", "второе"), {}),
+            ])
+        self.assertEqual(results, [False, False])
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.count_reminders(), 0)
+        self.db.scheduler.schedule.assert_not_called()
+
+
+class EnqueueTest(unittest.TestCase):
+    def setUp(self):
+        self.db = bot_v20.Database(db_name=os.path.join(workdir.name, f"{self.id()}.db"))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_recurring_reminder_is_advanced_once(self):
+        self.db.add_reminder(1, "2020-01-01T10:00:00", "каждый день", recurrence="daily")
+        self.db.cursor.execute("SELECT id, fire_at FROM reminders")
+        due = [tuple(self.db.cursor.fetchone())]
+
+        rescheduled = self.db.enqueue_reminders(due)
+        self.assertEqual(len(rescheduled), 1)
+        # Повтор того же срабатывания (устаревшая запись в куче другого процесса)
+        self.assertEqual(self.db.enqueue_reminders(due), [])
+
+        self.db.cursor.execute("SELECT fire_at FROM reminders")
+        self.assertEqual(self.db.cursor.fetchone()[0], rescheduled[0]['fire_at'])
+        self.db.cursor.execute("SELECT COUNT(*) FROM outbox")
+        self.assertEqual(self.db.cursor.fetchone()[0], 1)
+
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.db = bot_v20.Database(db_name=os.path.join(workdir.name, f"{self.id()}.db"))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_reminder_is_archived_after_delivery(self):
+        self.db.add_reminder(1, "2020-01-01T10:00:00", "давно")
+        self.db.cursor.execute("SELECT id, fire_at FROM reminders")
+        self.db.enqueue_reminders([tuple(self.db.cursor.fetchone())])
+        now = time.time()
+
+        # Сообщение ещё в outbox: отправитель запишет результат в reminders
+        self.assertEqual(self.db.archive_reminders(now + 1, now + 1), 0)
+        self.db.cursor.execute("DELETE FROM outbox")
+        # Срабатывание давно, но отправлено только что
+        self.assertEqual(self.db.archive_reminders(now - 60, now - 60), 0)
+        self.assertEqual(self.db.archive_reminders(now + 1, now + 1), 1)
+        self.db.cursor.execute("SELECT status FROM reminders_archive")
+        self.assertEqual(self.db.cursor.fetchone()[0], 'sent')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Тесты отправки сообщений в Telegram (delivery.py).
+
+Нужны зависимости из requirements.txt. Запуск: python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+# Модули бота импортируются из корня репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+delivery = None
+RetryAfter = None
+
+
+def setUpModule():
+    global delivery, RetryAfter
+    try:
+        import delivery as module
+        from telegram.error import RetryAfter as error
+    except ImportError as e:
+        raise unittest.SkipTest(f"не установлены зависимости бота: {e}")
+    delivery, RetryAfter = module, error
+
+
+class FloodBot:
+    async def send_message(self, chat_id, text):
+        raise RetryAfter(30)
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_all_chats_wait_for_flood_control(self):
+        engine = delivery.SendEngine(FloodBot(), global_rate=25)
+        result = asyncio.run(engine.send(1, "текст"))
+        self.assertEqual((result.status, result.retry_after), (delivery.RETRY, 30))
+        # Токена нет ни для этого чата, ни для других, пока не пройдут 30 секунд
+        self.assertLess(engine._chat_bucket(1).tokens, 1 - 29 * engine.chat_rate)
+        self.assertLess(engine._global_bucket.tokens, 1 - 29 * 25)
+        self.assertTrue(engine._chat_bucket(2).is_full())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Тесты обработчиков диалогов бота.
+
+bot_v20 при импорте читает config.json и открывает базу в текущем каталоге,
+поэтому тесты работают во временном каталоге. Нужны зависимости из
+requirements.txt. Запуск: python -m unittest discover tests
+"""
+
+import inspect
+import json
+import os
+import re
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Модули бота импортируются из корня репозитория, а тесты работают во временном каталоге
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+bot_v20 = None
+workdir = None
+previous_cwd = None
+
+
+def setUpModule():
+    global bot_v20, workdir, previous_cwd
+    previous_cwd = os.getcwd()
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    with open("config.json", "w") as f:
+        json.dump({"TOKEN": "test"}, f)
+    try:
+        import bot_v20 as module
+    except ImportError as e:
+        os.chdir(previous_cwd)
+        workdir.cleanup()
+        raise unittest.SkipTest(f"не установлены зависимости бота: {e}")
+    bot_v20 = module
+
+
+def tearDownModule():
+    os.chdir(previous_cwd)
+    workdir.cleanup()
+
+
+class ConversationTest(unittest.TestCase):
+    def setUp(self):
+        # Вместо обработчиков telegram - сами функции, которые они вызывают
+        with mock.patch.object(bot_v20, 'ConversationHandler') as conversation, \
+                mock.patch.object(bot_v20, 'CallbackQueryHandler', side_effect=lambda callback, **kwargs: callback), \
+                mock.patch.object(bot_v20, 'MessageHandler', side_effect=lambda filters, callback: callback):
+            bot_v20.create_conversation_handler()
+        self.states = conversation.call_args.kwargs['states']
+
+    def test_every_returned_state_is_routed(self):
+        returned = set(re.findall(r"return ([A-Z][A-Z_]+)\b", inspect.getsource(bot_v20)))
+        self.assertIn('TEAM_VIEW', returned)
+        for name in returned:
+            with self.subTest(state=name):
+                self.assertIn(getattr(bot_v20, name), self.states)
+
+    def test_team_pages_are_routed_to_team_handler(self):
+        # Кнопки страниц списка команд приходят в состоянии TEAM_VIEW
+        self.assertEqual(self.states[bot_v20.TEAM_VIEW], [bot_v20.team_handler])
+
+
+if __name__ == "__main__":
+    unittest.main()
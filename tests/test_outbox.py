@@ -0,0 +1,120 @@
+"""
+Тесты отправки сообщений из outbox.
+
+Нужны зависимости из requirements.txt. Запуск: python -m unittest discover tests
+"""
+
+import asyncio
+import functools
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Модули бота импортируются из корня репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+outbox = None
+delivery = None
+
+
+def setUpModule():
+    global outbox, delivery
+    try:
+        import delivery as delivery_module
+        import outbox as outbox_module
+    except ImportError as e:
+        raise unittest.SkipTest(f"не установлены зависимости бота: {e}")
+    outbox, delivery = outbox_module, delivery_module
+
+
+def message(message_id, text):
+    return {'id': message_id, 'reminder_id': message_id, 'text': text, 'attempts': 0, 'fire_at': None}
+
+
+class CoalesceTest(unittest.TestCase):
+    def test_short_messages_are_combined(self):
+        messages = [message(1, "a" * 4), message(2, "b" * 4), message(3, "c" * 4)]
+        chunks = outbox.coalesce(messages, limit=10)
+        self.assertEqual(chunks, [
+            ("aaaa\n\nbbbb", messages[:2], None),
+            ("cccc", messages[2:], None),
+        ])
+
+    def test_long_message_is_split(self):
+        messages = [message(1, "a" * 4), message(2, "b" * 25), message(3, "c" * 2)]
+        chunks = outbox.coalesce(messages, limit=10)
+        # Части длинного сообщения идут отдельно; последняя объединяется со следующим сообщением
+        self.assertEqual(chunks, [
+            ("aaaa", messages[:1], None),
+            ("b" * 10, [], (messages[1], "b" * 15)),
+            ("b" * 10, [], (messages[1], "b" * 5)),
+            ("bbbbb\n\ncc", messages[1:], None),
+        ])
+
+    def test_every_character_is_sent_once(self):
+        messages = [message(1, "x" * 9), message(2, "y" * 31), message(3, ""), message(4, "z" * 10)]
+        chunks = outbox.coalesce(messages, limit=10)
+        self.assertTrue(all(len(text) <= 10 for text, _, _ in chunks))
+        self.assertEqual([m for _, completed, _ in chunks for m in completed], messages)
+        self.assertEqual(
+            "".join(text.replace(outbox.MESSAGE_SEPARATOR, "") for text, _, _ in chunks),
+            "x" * 9 + "y" * 31 + "z" * 10
+        )
+
+
+class FakeEngine:
+    def __init__(self, results):
+        self.results = list(results)
+        self.sent = []
+
+    async def send(self, chat_id, text):
+        self.sent.append(text)
+        return self.results.pop(0) if self.results else delivery.SendResult(delivery.SENT, None, None)
+
+
+class FakeDatabase:
+    def __init__(self, messages):
+        self.texts = {m['id']: m['text'] for m in messages}
+        self.rescheduled = []
+
+    async def complete_outbox(self, message_ids, failed_reminder_ids=()):
+        for message_id in message_ids:
+            del self.texts[message_id]
+
+    async def reschedule_outbox(self, message_ids, attempts, next_attempt_at, last_error):
+        self.rescheduled.extend(message_ids)
+
+    async def truncate_outbox(self, message_id, text):
+        self.texts[message_id] = text
+
+
+class PartialFailureTest(unittest.TestCase):
+    def test_delivered_parts_are_not_resent(self):
+        messages = [message(1, "a" * 4), message(2, "b" * 25)]
+        db = FakeDatabase(messages)
+        sender = outbox.OutboxSender(db)
+        # Короткий лимит длины вместо 4096 символов Telegram
+        coalesce = functools.partial(outbox.coalesce, limit=10)
+        sender.engine = FakeEngine([
+            delivery.SendResult(delivery.SENT, None, None),
+            delivery.SendResult(delivery.SENT, None, None),
+            delivery.SendResult(delivery.RETRY, 5, "Flood control"),
+        ])
+        with mock.patch.object(outbox, 'coalesce', coalesce):
+            asyncio.run(sender._send_chat(100, messages))
+
+        self.assertEqual(sender.engine.sent, ["aaaa", "b" * 10, "b" * 10])
+        self.assertEqual(db.rescheduled, [2])
+        # В outbox остался только недоставленный остаток
+        self.assertEqual(db.texts, {2: "b" * 15})
+
+        sender.engine = FakeEngine([])
+        with mock.patch.object(outbox, 'coalesce', coalesce):
+            asyncio.run(sender._send_chat(100, [message(2, db.texts[2])]))
+        self.assertEqual(sender.engine.sent, ["b" * 10, "b" * 5])
+        self.assertEqual(db.texts, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Тесты правил повторения напоминаний (recurrence.py).
+
+Запуск: python -m unittest discover tests
+"""
+
+import os
+import sys
+import time
+import unittest
+from datetime import datetime
+
+# Модули бота импортируются из корня репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recurrence import next_occurrence, validate_rule
+
+
+class MonthlyTest(unittest.TestCase):
+    def test_last_day_of_short_months(self):
+        moment = datetime(2024, 1, 31, 9, 0)
+        fired = []
+        for _ in range(4):
+            moment = next_occurrence("monthly:31", moment, now=moment)
+            fired.append(moment)
+        # В коротком месяце - последний день, в следующем длинном снова 31-е
+        self.assertEqual(fired, [
+            datetime(2024, 2, 29, 9, 0),
+            datetime(2024, 3, 31, 9, 0),
+            datetime(2024, 4, 30, 9, 0),
+            datetime(2024, 5, 31, 9, 0),
+        ])
+
+    def test_year_boundary(self):
+        self.assertEqual(
+            next_occurrence("monthly:31", datetime(2024, 12, 31, 9, 0), now=datetime(2024, 12, 31, 9, 0)),
+            datetime(2025, 1, 31, 9, 0)
+        )
+
+    def test_missed_months_are_skipped(self):
+        self.assertEqual(
+            next_occurrence("monthly:15", datetime(2024, 1, 15, 9, 0), now=datetime(2024, 6, 20)),
+            datetime(2024, 7, 15, 9, 0)
+        )
+
+
+@unittest.skipUnless(hasattr(time, "tzset"), "смена часового пояса недоступна")
+class DaylightSavingTest(unittest.TestCase):
+    def setUp(self):
+        self.previous_tz = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Berlin"
+        time.tzset()
+
+    def tearDown(self):
+        if self.previous_tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = self.previous_tz
+        time.tzset()
+
+    def test_daily_keeps_local_time(self):
+        # 31 марта 2024 в Берлине переводят часы: сутки длятся 23 часа
+        previous = datetime(2024, 3, 30, 10, 0)
+        moment = next_occurrence("daily", previous, now=previous)
+        self.assertEqual(moment, datetime(2024, 3, 31, 10, 0))
+        self.assertEqual(moment.timestamp() - previous.timestamp(), 23 * 3600)
+
+    def test_cron_keeps_local_time(self):
+        previous = datetime(2024, 10, 26, 10, 0)
+        moment = next_occurrence("cron:0 10 * * *", previous, now=previous)
+        self.assertEqual(moment, datetime(2024, 10, 27, 10, 0))
+        self.assertEqual(moment.timestamp() - previous.timestamp(), 25 * 3600)
+
+
+class CronTest(unittest.TestCase):
+    def test_weekdays(self):
+        friday = datetime(2024, 3, 15, 9, 0)
+        self.assertEqual(next_occurrence("cron:0 9 * * 1-5", friday, now=friday), datetime(2024, 3, 18, 9, 0))
+
+    def test_sunday_as_seven(self):
+        self.assertEqual(
+            next_occurrence("cron:30 8 * * 7", datetime(2024, 3, 15, 9, 0), now=datetime(2024, 3, 15, 9, 0)),
+            datetime(2024, 3, 17, 8, 30)
+        )
+
+    def test_day_of_month_or_day_of_week(self):
+        # Ограничены оба поля: достаточно совпадения любого (пятница 6-го раньше 13-го)
+        start = datetime(2024, 9, 1, 12, 0)
+        self.assertEqual(next_occurrence("cron:0 9 13 * 5", start, now=start), datetime(2024, 9, 6, 9, 0))
+
+    def test_does_not_repeat_current_minute(self):
+        moment = datetime(2024, 3, 15, 9, 0)
+        self.assertEqual(next_occurrence("cron:*/15 * * * *", moment, now=moment), datetime(2024, 3, 15, 9, 15))
+
+
+class InvalidRuleTest(unittest.TestCase):
+    def test_validate_rule(self):
+        for rule in ("daily", "weekly", "monthly:1", "monthly:31", "cron:0 9 * * 1-5", "cron:0 0 29 2 *"):
+            validate_rule(rule)
+        for rule in ("hourly", "monthly:0", "monthly:32", "monthly:x", "cron:0 9 * *",
+                     "cron:60 * * * *", "cron:*/0 * * * *", "cron:0 9 * * 8", "cron:0 9 5-1 * *"):
+            with self.subTest(rule=rule):
+                self.assertRaises(ValueError, validate_rule, rule)
+
+    def test_next_occurrence(self):
+        moment = datetime(2024, 1, 1)
+        self.assertRaises(ValueError, next_occurrence, "hourly", moment, now=moment)
+        # Корректное, но никогда не срабатывающее выражение
+        self.assertRaises(ValueError, next_occurrence, "cron:0 0 30 2 *", moment, now=moment)
+
+    def test_leap_day_is_found(self):
+        moment = datetime(2025, 3, 1)
+        self.assertEqual(next_occurrence("cron:0 0 29 2 *", moment, now=moment), datetime(2028, 2, 29))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,514 @@
+"""
+Выгрузка и загрузка команд и напоминаний.
+
+Выгрузка пишет NDJSON (одна запись JSON на строку): сначала команды с
+участниками, затем напоминания (с --archived - и архив). Строки читаются из
+базы порциями, поэтому память не зависит от размера базы.
+
+Загрузка принимает NDJSON из выгрузки или календарь iCalendar (.ics) и пишет
+записи пачками (--batch) в одной транзакции, минуя add_reminder. Вместе с
+каждой пачкой в базе запоминается позиция в файле: прерванную загрузку
+достаточно запустить снова с тем же --name, повторно записи не добавятся.
+Команды получают новые ID, напоминания ссылаются на них.
+
+Работающий бот подхватывает новые напоминания сам; списки команд в его кэше
+обновятся через "team_cache_ttl" секунд.
+
+Запуск:
+    python transfer.py export [-o data.ndjson] [--archived]
+    python transfer.py import data.ndjson
+    python transfer.py import calendar.ics --user-id 123456 [--team-id 7]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from bot_v20 import database, logger, reminder_epoch, reminder_shard
+from recurrence import next_occurrence, validate_rule
+from storage import DATABASE_ERRORS
+
+# Как часто сообщать о ходе выгрузки (в записях)
+EXPORT_PROGRESS_EVERY = 100000
+
+# Статусы напоминаний, которые можно загрузить как есть (остальные, например
+# expired из архива, загружаются как failed - они уже не будут отправлены)
+REMINDER_STATUSES = ('pending', 'sent', 'failed')
+
+# Дни недели BYDAY в iCalendar -> день недели cron
+ICS_WEEKDAYS = {'SU': 0, 'MO': 1, 'TU': 2, 'WE': 3, 'TH': 4, 'FR': 5, 'SA': 6}
+
+# Служебные таблицы загрузки: позиция в файле и соответствие ID команд
+IMPORT_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS import_progress (
+        name TEXT PRIMARY KEY,
+        position BIGINT NOT NULL,
+        imported BIGINT NOT NULL DEFAULT 0,
+        skipped BIGINT NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS import_teams (
+        name TEXT NOT NULL,
+        source_id BIGINT NOT NULL,
+        team_id BIGINT NOT NULL,
+        PRIMARY KEY (name, source_id)
+    )
+    '''
+]
+
+
+def export_ndjson(db, output, archived=False):
+    """Выгрузка команд и напоминаний в NDJSON.
+
+    Args:
+        db (Database): База данных
+        output (file): Текстовый файл для записи
+        archived (bool): Добавить напоминания из архива
+
+    Returns:
+        int: Количество выгруженных записей
+    """
+    backend = db.backend
+    count = 0
+    started = time.monotonic()
+
+    def write(record):
+        nonlocal count
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+        if count % EXPORT_PROGRESS_EVERY == 0:
+            logger.info(f"Выгружено записей: {count} ({count / (time.monotonic() - started):.0f} в секунду)")
+
+    # Участники идут подряд после своей команды: собираем их без загрузки всех команд в память
+    rows = backend.stream(db.conn, '''
+        SELECT teams.id, teams.name, teams.created_by, team_members.user_id AS member
+        FROM teams LEFT JOIN team_members ON team_members.team_id = teams.id
+        ORDER BY teams.id, team_members.joined_at, team_members.user_id
+    ''')
+    for team_id, team_rows in itertools.groupby(rows, key=lambda row: row['id']):
+        team_rows = list(team_rows)
+        write({
+            'type': 'team',
+            'id': team_id,
+            'name': team_rows[0]['name'],
+            'created_by': team_rows[0]['created_by'],
+            'members': [row['member'] for row in team_rows if row['member'] is not None]
+        })
+
+    queries = [
+        'SELECT id, user_id, reminder_time, reminder_text, team_id, team_name, recurrence, status, '
+        'sent_at, failed_at FROM reminders ORDER BY id'
+    ]
+    if archived:
+        queries.append(
+            'SELECT id, user_id, reminder_time, archived_text(reminder_text) AS reminder_text, team_id, '
+            'team_name, recurrence, status, sent_at, failed_at FROM reminders_archive ORDER BY id'
+        )
+    for query in queries:
+        for reminder in backend.stream(db.conn, query):
+            write({
+                'type': 'reminder',
+                'id': reminder['id'],
+                'user_id': reminder['user_id'],
+                'reminder_time': reminder['reminder_time'],
+                'reminder_text': reminder['reminder_text'],
+                'team_id': reminder['team_id'],
+                'team_name': reminder['team_name'],
+                'recurrence': reminder['recurrence'],
+                'status': reminder['status'],
+                'sent_at': reminder['sent_at'],
+                'failed_at': reminder['failed_at']
+            })
+    db.conn.rollback()
+    return count
+
+
+class Importer:
+    def __init__(self, db, name, batch=10000):
+        """Инициализация загрузки.
+
+        Args:
+            db (Database): База данных
+            name (str): Имя загрузки, под которым запоминается её позиция
+            batch (int): Сколько записей писать в одной транзакции
+        """
+        self.db = db
+        self.name = name
+        self.batch = batch
+        self.position = 0
+        self.imported = 0
+        self.skipped = 0
+        self.teams = {}  # ID команды в файле -> (ID в базе, название)
+        self._reminders = []  # строки напоминаний текущей пачки
+        self._pending = 0  # записей в текущей пачке
+        self._started = time.monotonic()
+        self._imported_at_start = 0
+
+    def load(self):
+        """Создание служебных таблиц и чтение сохранённой позиции загрузки.
+
+        Returns:
+            int: Позиция в файле, с которой продолжить загрузку
+        """
+        cursor = self.db.cursor
+        for statement in IMPORT_TABLES:
+            cursor.execute(statement)
+        cursor.execute(
+            "SELECT position, imported, skipped FROM import_progress WHERE name = ?",
+            (self.name,)
+        )
+        row = cursor.fetchone()
+        if row:
+            self.position, self.imported, self.skipped = row['position'], row['imported'], row['skipped']
+            self._imported_at_start = self.imported
+        cursor.execute("SELECT source_id, team_id FROM import_teams WHERE name = ?", (self.name,))
+        team_ids = {row['source_id']: row['team_id'] for row in cursor.fetchall()}
+        if team_ids:
+            cursor.execute(
+                f"SELECT id, name FROM teams WHERE id IN ({self.db.sql.id_list})",
+                (json.dumps(list(team_ids.values())),)
+            )
+            names = {row['id']: row['name'] for row in cursor.fetchall()}
+            self.teams = {
+                source_id: (team_id, names[team_id])
+                for source_id, team_id in team_ids.items() if team_id in names
+            }
+        self.db.conn.commit()
+        return self.position
+
+    def add_team(self, source_id, name, created_by, members):
+        """Добавление команды (в транзакции текущей пачки)."""
+        cursor = self.db.cursor
+        team_id = self.db.insert_team(name, created_by)
+        cursor.executemany(
+            "INSERT INTO team_members (team_id, user_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+            [(team_id, member) for member in members]
+        )
+        cursor.execute(
+            "INSERT INTO import_teams (name, source_id, team_id) VALUES (?, ?, ?)",
+            (self.name, source_id, team_id)
+        )
+        self.teams[source_id] = (team_id, name)
+        self._pending += 1
+
+    def add_reminder(self, user_id, reminder_time, reminder_text, team_id=None, team_name=None,
+                     recurrence=None, status='pending', sent_at=None, failed_at=None):
+        """Добавление напоминания в текущую пачку."""
+        self._reminders.append((
+            user_id, reminder_time, reminder_text, team_id, team_name, reminder_epoch(reminder_time),
+            reminder_shard(user_id), recurrence, status, sent_at, failed_at
+        ))
+        self._pending += 1
+
+    def skip(self, reason):
+        """Пропуск записи, которую нельзя загрузить."""
+        self.skipped += 1
+        logger.warning(f"Запись пропущена (позиция {self.position}): {reason}")
+
+    def advance(self, position):
+        """Запись закончилась на этой позиции файла; полная пачка записывается в базу."""
+        self.position = position
+        if self._pending >= self.batch:
+            self.flush()
+
+    def _insert_reminders(self):
+        """Добавление напоминаний пачки (в транзакции текущей пачки)."""
+        cursor = self.db.cursor
+        insert = (
+            "INSERT INTO reminders (user_id, reminder_time, reminder_text, team_id, team_name, fire_at, "
+            "shard, recurrence, status, sent_at, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        if self.db.sql.name != 'sqlite' or not self._reminders:
+            cursor.executemany(insert, self._reminders)
+            return
+        # Триггер FTS5 индексирует напоминания по одному; пачку быстрее проиндексировать
+        # одним запросом. Триггер удаляется и создаётся заново в той же транзакции,
+        # поэтому другие процессы его отсутствия не увидят
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'reminders_fts_insert'")
+        trigger = cursor.fetchone()
+        if trigger is None:
+            cursor.executemany(insert, self._reminders)
+            return
+        if not self.db.conn.in_transaction:
+            cursor.execute("BEGIN")
+        cursor.execute("DROP TRIGGER reminders_fts_insert")
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM reminders")
+        last_id = cursor.fetchone()[0]
+        cursor.executemany(insert, self._reminders)
+        cursor.execute(
+            "INSERT INTO reminders_fts (rowid, reminder_text) SELECT id, reminder_text FROM reminders WHERE id > ?",
+            (last_id,)
+        )
+        cursor.execute(trigger['sql'])
+
+    def flush(self):
+        """Запись пачки в базу одной транзакцией вместе с позицией в файле."""
+        self._insert_reminders()
+        self.imported += self._pending
+        cursor = self.db.cursor
+        cursor.execute(
+            "INSERT INTO import_progress (name, position, imported, skipped) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET position = excluded.position, "
+            "imported = excluded.imported, skipped = excluded.skipped",
+            (self.name, self.position, self.imported, self.skipped)
+        )
+        self.db.conn.commit()
+        self._reminders = []
+        self._pending = 0
+
+        rate = (self.imported - self._imported_at_start) / max(time.monotonic() - self._started, 1e-9)
+        logger.info(f"Загружено записей: {self.imported}, пропущено: {self.skipped}, позиция {self.position} ({rate:.0f} в секунду)")
+
+
+def import_ndjson(importer, file):
+    """Загрузка записей NDJSON (формат export_ndjson) с позиции importer.position."""
+    position = file.tell()
+    for line in file:
+        position += len(line)
+        if not line.strip():
+            importer.advance(position)
+            continue
+        try:
+            record = json.loads(line)
+            if record['type'] == 'team':
+                importer.add_team(
+                    int(record['id']), str(record['name']), int(record['created_by']),
+                    [int(member) for member in record.get('members', [])]
+                )
+            elif record['type'] == 'reminder':
+                team_id, team_name = None, None
+                if record.get('team_id') is not None:
+                    if record['team_id'] not in importer.teams:
+                        raise ValueError(f"неизвестная команда {record['team_id']}")
+                    team_id, team_name = importer.teams[record['team_id']]
+                recurrence = record.get('recurrence') or None
+                if recurrence:
+                    validate_rule(recurrence)
+                status = record.get('status', 'pending')
+                importer.add_reminder(
+                    int(record['user_id']),
+                    datetime.fromisoformat(record['reminder_time']).isoformat(),
+                    str(record['reminder_text']),
+                    team_id, team_name, recurrence,
+                    status if status in REMINDER_STATUSES else 'failed',
+                    record.get('sent_at'), record.get('failed_at')
+                )
+            else:
+                raise ValueError(f"неизвестный тип записи {record['type']}")
+        except (KeyError, TypeError, ValueError) as e:
+            importer.skip(e)
+        importer.advance(position)
+
+
+def _unfold(file):
+    """Логические строки iCalendar (длинные строки перенесены с пробелом) и позиция в файле после каждой."""
+    position = file.tell()
+    line = None
+    for raw in file:
+        text = raw.decode('utf-8').rstrip('\r\n')
+        if text[:1] in (' ', '\t') and line is not None:
+            line += text[1:]
+        else:
+            if line is not None:
+                yield line, position
+            line = text
+        position += len(raw)
+    if line is not None:
+        yield line, position
+
+
+def _parse_ics_line(line):
+    """Разбор строки iCalendar "ИМЯ;ПАРАМЕТР=ЗНАЧЕНИЕ:значение" в (имя, параметры, значение)."""
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return line.upper(), {}, ''
+    name, *params = head.split(';')
+    return name.upper(), dict(
+        (key.upper(), value.strip('"')) for key, _, value in (param.partition('=') for param in params)
+    ), value
+
+
+def read_ics(file):
+    """События календаря: пары (свойства VEVENT, позиция в файле после события).
+
+    Свойства - словарь имя -> (параметры, значение); вложенные компоненты
+    (например, VALARM) пропускаются.
+    """
+    event = None
+    depth = 0
+    for line, position in _unfold(file):
+        name, params, value = _parse_ics_line(line)
+        if name == 'BEGIN':
+            if event is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                event, depth = {}, 0
+        elif name == 'END' and event is not None:
+            if depth:
+                depth -= 1
+            elif value.upper() == 'VEVENT':
+                yield event, position
+                event = None
+        elif event is not None and not depth:
+            event.setdefault(name, (params, value))
+
+
+def _ics_text(value):
+    """Значение текстового свойства iCalendar без экранирования."""
+    return re.sub(r'\\([\\;,nN])', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def _ics_time(params, value):
+    """Локальное время (как reminder_time) из DTSTART."""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d')
+    moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    if 'TZID' in params:
+        try:
+            return moment.replace(tzinfo=ZoneInfo(params['TZID'])).astimezone().replace(tzinfo=None)
+        except (KeyError, ValueError):
+            # Неизвестный часовой пояс (например, в формате Windows) - считаем время местным
+            pass
+    return moment
+
+
+def _ics_rule(rrule, start):
+    """Правило повторения (см. recurrence.py) из RRULE или None, если его не выразить."""
+    parts = dict(part.split('=', 1) for part in rrule.upper().split(';') if '=' in part)
+    frequency = parts.pop('FREQ', None)
+    parts.pop('WKST', None)
+    if parts.pop('INTERVAL', '1') != '1' or 'COUNT' in parts or 'UNTIL' in parts:
+        return None
+    try:
+        if frequency == 'DAILY' and not parts:
+            return 'daily'
+        if frequency == 'WEEKLY' and set(parts) <= {'BYDAY'}:
+            if 'BYDAY' not in parts:
+                return 'weekly'
+            weekdays = sorted({ICS_WEEKDAYS[day] for day in parts['BYDAY'].split(',')})
+            return f"cron:{start.minute} {start.hour} * * {','.join(map(str, weekdays))}"
+        if frequency == 'MONTHLY' and set(parts) <= {'BYMONTHDAY'}:
+            day = int(parts.get('BYMONTHDAY', start.day))
+            return f"monthly:{day}" if 1 <= day <= 31 else None
+        if frequency == 'YEARLY' and not parts:
+            return f"cron:{start.minute} {start.hour} {start.day} {start.month} *"
+    except (KeyError, ValueError):
+        return None
+    return None
+
+
+def import_ics(importer, file, user_id, team_id=None):
+    """Загрузка событий календаря как напоминаний пользователя (или его команды).
+
+    Прошедшие разовые события отмечаются отправленными, у повторяющихся
+    берётся ближайшее будущее срабатывание.
+    """
+    team_name = None
+    if team_id is not None:
+        team = importer.db.get_team_by_id(team_id)
+        if not team:
+            raise ValueError(f"Команда {team_id} не найдена")
+        team_name = team['name']
+
+    now = datetime.now()
+    for event, position in read_ics(file):
+        try:
+            start = _ics_time(*event['DTSTART'])
+            texts = [_ics_text(event[name][1]) for name in ('SUMMARY', 'DESCRIPTION') if name in event]
+            text = "\n".join(text for text in texts if text) or "Событие календаря"
+            recurrence = None
+            if 'RRULE' in event:
+                recurrence = _ics_rule(event['RRULE'][1], start)
+                if recurrence is None:
+                    raise ValueError(f"правило {event['RRULE'][1]} не поддерживается")
+            status, sent_at = 'pending', None
+            if start <= now:
+                if recurrence:
+                    start = next_occurrence(recurrence, start, now=now)
+                else:
+                    status, sent_at = 'sent', reminder_epoch(start)
+            importer.add_reminder(
+                user_id, start.isoformat(), text, team_id, team_name, recurrence, status, sent_at
+            )
+        except (KeyError, ValueError) as e:
+            importer.skip(f"{event.get('UID', (None, '?'))[1]}: {e}")
+        importer.advance(position)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка и загрузка команд и напоминаний")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Выгрузка в NDJSON")
+    export_parser.add_argument("-o", "--output", default="-", help="Файл для записи (по умолчанию stdout)")
+    export_parser.add_argument("--archived", action="store_true", help="Выгрузить и архив напоминаний")
+
+    import_parser = commands.add_parser("import", help="Загрузка из NDJSON или iCalendar (.ics)")
+    import_parser.add_argument("file", help="Файл NDJSON или .ics")
+    import_parser.add_argument("--format", choices=("ndjson", "ics"), help="Формат (по умолчанию по расширению)")
+    import_parser.add_argument("--name", help="Имя загрузки для продолжения после сбоя (по умолчанию имя файла)")
+    import_parser.add_argument("--batch", type=int, default=10000, help="Записей в одной транзакции")
+    import_parser.add_argument("--user-id", type=int, help="Владелец напоминаний из .ics")
+    import_parser.add_argument("--team-id", type=int, help="Команда для напоминаний из .ics")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            if args.output == "-":
+                output = open(sys.stdout.fileno(), "w", encoding="utf-8", closefd=False)
+            else:
+                output = open(args.output, "w", encoding="utf-8")
+            with output:
+                count = export_ndjson(database, output, archived=args.archived)
+            logger.info(f"Выгрузка завершена, записей: {count}")
+            return 0
+
+        file_format = args.format or ("ics" if args.file.lower().endswith(".ics") else "ndjson")
+        if file_format == "ics" and args.user_id is None:
+            parser.error("для .ics нужен --user-id")
+        importer = Importer(database, args.name or os.path.basename(args.file), batch=args.batch)
+        position = importer.load()
+        size = os.path.getsize(args.file)
+        if position >= size:
+            logger.info(f"Файл {args.file} уже загружен (записей: {importer.imported})")
+            return 0
+        if position:
+            logger.info(f"Продолжение загрузки {importer.name} с позиции {position} из {size}")
+
+        with open(args.file, "rb") as file:
+            file.seek(position)
+            if file_format == "ics":
+                import_ics(importer, file, args.user_id, args.team_id)
+            else:
+                import_ndjson(importer, file)
+            # Позиция конца файла: хвост после последнего события тоже прочитан
+            importer.position = size
+            importer.flush()
+        logger.info(f"Загрузка завершена, записей: {importer.imported}, пропущено: {importer.skipped}")
+        return 0
+    except DATABASE_ERRORS + (OSError, ValueError) as e:
+        database.conn.rollback()
+        logger.error(f"Ошибка переноса данных: {e}")
+        return 1
+    finally:
+        database.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+Отдельный процесс планировщика напоминаний.
+
+Можно запустить несколько таких процессов (на одной или разных машинах с общей
+базой): разделы напоминаний распределяются между ними через аренду в базе.
+Планировщик только ставит сообщения в outbox, отправляет их sender.py
+или процесс бота.
+Запуск: python worker.py
+"""
+
+import asyncio
+
+from bot_v20 import archiver, db, logger, scheduler, start_metrics_export
+
+
+async def run_worker():
+    """Запуск планировщика без обработки сообщений пользователей."""
+    await scheduler.start()
+    archiver.start()
+    metrics_task = start_metrics_export()
+    try:
+        # Работаем, пока процесс не остановят
+        await asyncio.Event().wait()
+    finally:
+        if metrics_task:
+            metrics_task.cancel()
+        await scheduler.stop()
+        await archiver.stop()
+        await db.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_worker())
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("👋 Планировщик остановлен пользователем.")